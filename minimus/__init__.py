@@ -0,0 +1,20 @@
+"""Связывание заметок между собой с помощью тегов.
+
+Обработку можно запускать и из другой программы:
+
+    import minimus
+
+    result = minimus.run('notes', minimus.Settings(jobs=4))
+    print(result['saved_notes'])
+"""
+from minimus.src.objects import Settings
+from minimus.src.session import RunResult
+from minimus.src.session import Session
+from minimus.src.session import run
+
+__all__ = [
+    'RunResult',
+    'Session',
+    'Settings',
+    'run',
+]
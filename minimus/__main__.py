@@ -1,76 +1,288 @@
 """Основной модуль.
 """
+import argparse
+from concurrent.futures import Executor
+import cProfile
+from pathlib import Path
+import sys
 import time
+from typing import Callable
 
-from minimus.src import constants
+from minimus.src import arguments
+from minimus.src import index
 from minimus.src import markup
+from minimus.src import metrics
 from minimus.src import objects
 from minimus.src import output
+from minimus.src import pipeline
+from minimus.src import retag
+from minimus.src import runner
+from minimus.src import search
+from minimus.src import snapshot
 from minimus.src import storage
+from minimus.src import watcher
 
 
 def main() -> None:
     """Точка входа."""
-    start_time = time.perf_counter()
+    argv = sys.argv[1:]
+
+    if argv and argv[0] in COMMANDS:
+        COMMANDS[argv[0]](argv[1:])
+        return
 
-    path = storage.get_path()
-    output.greet()
-    output.print_path(path)
+    build(argv)
 
-    cache = objects.Cache(path=path, contents={})
-    cache.load()
 
-    files = storage.get_files(path)
-    files.sort(key=lambda file: file.sort_key)
+def build(argv: list[str]) -> None:
+    """Обработать каталоги с заметками.
 
-    gathered_tags, neighbours = markup.gather_tags_from_files(files)
+    Каталоги обрабатываются по очереди в одном процессе с общим пулом
+    исполнителей, но у каждого свой кеш, документы тегов и README.
+    Если каталогов несколько, в конце выводится время по каждому.
+    """
+    start_time = time.perf_counter()
 
-    if not gathered_tags:
-        output.header(f'В каталоге {path.absolute()} заметок не найдено')
+    raw_paths, settings = arguments.parse_arguments(argv)
+    paths = [storage.get_path(raw_path) for raw_path in raw_paths]
+    reporter = output.make_reporter(
+        settings.verbosity,
+        settings.output_format,
+    )
+    reporter.greet()
+
+    if settings.watch:
+        path = paths[0]
+        reporter.print_path(path)
+        cache = objects.make_cache(path, settings)
+        cache.load()
+        watcher.watch(path, settings, cache, reporter)
         return
 
-    output.header('Сохранение заметок')
-    for each_file in files:
-        if cache.has_no_changes(each_file):
-            print(f'\tТеги не менялись: {each_file.relative_path}')
-        else:
-            new_content = markup.replace_bare_tags(each_file)
-
-            if new_content != each_file.content:
-                each_file.content = new_content
-                each_file.save()
-                print(f'\t+++ Сохранён: {each_file.relative_path}')
-            else:
-                print(f'\tТеги не менялись: {each_file.relative_path}')
-
-        cache.store_file(each_file)
-
-    output.header('Сохранение тегов')
-    storage.ensure_folder_for_tags(path)
-    for tag, sub_files in gathered_tags.items():
-        filename = markup.get_tag_filename(tag)
-        sorted_sub_files = sorted(sub_files, key=lambda file: file.sort_key)
-        tag_content = markup.make_tag_content(
-            tag=tag,
-            files=sorted_sub_files,
-            neighbours=neighbours,
+    profiler = cProfile.Profile() if settings.profile else None
+    executor = pipeline.make_executor(settings)
+    vaults: list[output.VaultResult] = []
+
+    try:
+        for path in paths:
+            vaults.append(
+                build_vault(path, settings, reporter, executor, profiler)
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if len(vaults) > 1:
+        reporter.print_vaults(vaults, time.perf_counter() - start_time)
+
+        if settings.stats:
+            total_metrics = metrics.Metrics()
+            for vault in vaults:
+                total_metrics.merge(vault['metrics'])
+            reporter.print_metrics(total_metrics, settings.stats)
+
+    if profiler is not None:
+        reporter.print_profile(profiler)
+
+
+def build_vault(
+    path: Path,
+    settings: objects.Settings,
+    reporter: output.Reporter,
+    executor: Executor | None,
+    profiler: cProfile.Profile | None,
+) -> output.VaultResult:
+    """Обработать один каталог с заметками."""
+    start_time = time.perf_counter()
+    reporter.print_path(path)
+    run_metrics = metrics.Metrics()
+
+    with run_metrics.phase('snapshot'):
+        unchanged = snapshot.is_unchanged(path, settings)
+
+    if unchanged:
+        reporter.event(
+            'unchanged',
+            '\nС прошлого запуска ничего не изменилось',
+            path=path.absolute(),
         )
-        tag_path = path / constants.TAGS_FOLDER / filename
-        tag_object = objects.File(path=tag_path, content=tag_content)
-        tag_object.save()
-    print(f'\tСохранено тегов: {len(gathered_tags)} шт. ')
-
-    output.header('Генерация вспомогательных файлов')
-    readme_content = markup.make_readme_content(files)
-    readme_path = path / constants.README_FILENAME
-    readme = objects.File(path=readme_path, content=readme_content)
-    readme.save()
-    print(f'\tСохранён: {readme_path.absolute()}')
-
-    cache_path = cache.save()
-    print(f'\tСохранён: {cache_path.absolute()}')
-
-    output.complete(time.perf_counter() - start_time)
+        seconds = time.perf_counter() - start_time
+        reporter.complete(seconds)
+        if settings.stats:
+            reporter.print_metrics(run_metrics, settings.stats)
+        return output.VaultResult(
+            path=path,
+            seconds=seconds,
+            unchanged=True,
+            metrics=run_metrics,
+        )
+
+    cache = objects.make_cache(path, settings)
+    with run_metrics.phase('cache_load'):
+        cache.load()
+
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        found = runner.run(
+            path,
+            settings,
+            cache,
+            executor=executor,
+            metrics=run_metrics,
+            reporter=reporter,
+        )
+    finally:
+        cache.close()
+
+    if profiler is not None:
+        profiler.disable()
+
+    seconds = time.perf_counter() - start_time
+
+    if found:
+        reporter.complete(seconds)
+
+        if settings.stats:
+            reporter.print_metrics(run_metrics, settings.stats)
+
+    return output.VaultResult(
+        path=path,
+        seconds=seconds,
+        unchanged=False,
+        metrics=run_metrics,
+    )
+
+
+def query(argv: list[str]) -> None:
+    """Найти заметки по выражению из тегов."""
+    start_time = time.perf_counter()
+    parser = arguments.make_query_parser()
+    options = parser.parse_args(argv)
+    path = storage.get_path(options.path)
+    reporter = output.make_reporter(options.verbosity, options.output_format)
+
+    tag_index = index.TagIndex.load(path)
+    if tag_index is None:
+        parser.error(
+            f'Индекс тегов не найден в {path.absolute()}, '
+            f'сначала обработайте каталог командой minimus'
+        )
+
+    try:
+        found = tag_index.query(options.expression)
+    except index.QueryError as exc:
+        parser.error(str(exc))
+
+    for note_id in found:
+        relative_path, title, _ = tag_index.notes[note_id]
+        reporter.event(
+            'match',
+            f'- {markup.as_href(title, markup.escape(relative_path))}',
+            level='quiet',
+            path=relative_path,
+            title=title,
+        )
+
+    milliseconds = (time.perf_counter() - start_time) * 1000
+    reporter.event(
+        'found',
+        f'Найдено заметок: {len(found)} шт. за {milliseconds:0.1f} мс',
+        total=len(found),
+        milliseconds=round(milliseconds, 3),
+    )
+    reporter.flush()
+
+
+def search_notes(argv: list[str]) -> None:
+    """Найти заметки по словам в тексте."""
+    start_time = time.perf_counter()
+    parser = arguments.make_search_parser()
+    options = parser.parse_args(argv)
+    path = storage.get_path(options.path)
+    reporter = output.make_reporter(options.verbosity, options.output_format)
+
+    if not search.SearchIndex.exists(path):
+        parser.error(
+            f'Полнотекстовый индекс не найден в {path.absolute()}, '
+            f'сначала обработайте каталог командой minimus --search-index'
+        )
+
+    search_index = search.SearchIndex(path)
+    try:
+        found = search_index.search(options.text, limit=options.limit)
+    finally:
+        search_index.close()
+
+    for result in found:
+        link = markup.escape(result['path'])
+        reporter.event(
+            'match',
+            f'- {markup.as_href(result["title"], link)} '
+            f'(вес {result["score"]:0.3f})',
+            level='quiet',
+            **result,
+        )
+        reporter.text(f'\t{result["snippet"]}')
+
+    milliseconds = (time.perf_counter() - start_time) * 1000
+    reporter.event(
+        'found',
+        f'Найдено заметок: {len(found)} шт. за {milliseconds:0.1f} мс',
+        total=len(found),
+        milliseconds=round(milliseconds, 3),
+    )
+    reporter.flush()
+
+
+def rename_tag(argv: list[str]) -> None:
+    """Переименовать тег в обработанном каталоге."""
+    parser = arguments.make_rename_parser()
+    options = parser.parse_args(argv)
+    change_tags(parser, options, {options.old: options.new})
+
+
+def merge_tags(argv: list[str]) -> None:
+    """Слить несколько тегов в один в обработанном каталоге."""
+    parser = arguments.make_merge_parser()
+    options = parser.parse_args(argv)
+    change_tags(
+        parser,
+        options,
+        {
+            source: options.target
+            for source in options.sources
+            if source != options.target
+        },
+    )
+
+
+def change_tags(
+    parser: argparse.ArgumentParser,
+    options: argparse.Namespace,
+    renames: dict[str, str],
+) -> None:
+    """Заменить теги по словарю и сообщить о результате."""
+    start_time = time.perf_counter()
+    path = storage.get_path(options.path)
+    reporter = output.make_reporter(options.verbosity, options.output_format)
+    reporter.print_path(path)
+
+    try:
+        retag.rename_tags(path, renames, reporter)
+    except retag.RetagError as exc:
+        parser.error(str(exc))
+
+    reporter.complete(time.perf_counter() - start_time)
+
+
+COMMANDS: dict[str, Callable[[list[str]], None]] = {
+    'query': query,
+    'search': search_notes,
+    'rename-tag': rename_tag,
+    'merge-tags': merge_tags,
+}
 
 
 if __name__ == '__main__':
@@ -0,0 +1,437 @@
+"""Набор замеров производительности на синтетических каталогах.
+
+Запуск:
+    python -m minimus.bench --notes 5000 --output result.json
+
+Генерация детерминирована (зависит только от параметров и seed),
+поэтому результаты разных версий кода можно сравнивать между собой.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+from pathlib import Path
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Any
+
+from minimus.src import arguments
+from minimus.src import constants
+from minimus.src import markup
+from minimus.src import metrics as metrics_module
+from minimus.src import objects
+from minimus.src import output
+from minimus.src import runner
+from minimus.src import scanner
+from minimus.src import utils
+
+# Кусочки случайных текстов при сверке разбора с шаблонами
+FUZZ_ALPHABET = (
+    '{', '{', '}', '}', '[', ']', '#', ' ', ' ', '\t', '\n', '\r',
+    '\xa0', '\u3000', '\x1c', 'a', 'ж', '{{ ', ' }}', '\xa0}}',
+)
+
+# Тексты, на которых ленивые шаблоны уходят в долгие возвраты,
+# и размер, дальше которого шаблоны не замеряются: слишком долго
+ADVERSARIAL = {
+    'unclosed': (lambda size: '{{ a ' * size + '\n' + ' ' * size, 2000),
+    'spaces': (lambda size: '{{' + ' ' * size + 'x' + ' ' * size, 500),
+    'braces': (lambda size: '{' * size + ' }}', 2000),
+    'linked': (lambda size: '{{ a' + ' }}]' * size, 2000),
+}
+
+SYLLABLES = (
+    'ка', 'ро', 'ми', 'сту', 'ле', 'дра', 'вё', 'жу', 'ны', 'пи',
+    'ще', 'зо', 'ба', 'гу', 'ца', 'эль', 'ю', 'ха', 'ти', 'on',
+)
+
+
+def make_word(rng: random.Random) -> str:
+    """Сгенерировать случайное слово."""
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def make_vocabulary(rng: random.Random, size: int) -> list[str]:
+    """Сгенерировать словарь тегов, в том числе из нескольких слов."""
+    vocabulary: set[str] = set()
+    while len(vocabulary) < size:
+        words = [make_word(rng) for _ in range(rng.randint(1, 3))]
+        vocabulary.add(' '.join(words).capitalize())
+    return sorted(vocabulary)
+
+
+def make_note(
+    rng: random.Random,
+    number: int,
+    tags: list[str],
+    note_size: int,
+) -> str:
+    """Сгенерировать текст заметки примерно заданного размера."""
+    lines = [f'# Заметка {number}', '']
+    size = 0
+
+    while size < note_size:
+        line = ' '.join(make_word(rng) for _ in range(rng.randint(5, 15)))
+        if tags and rng.random() < 0.2:
+            line += f' {{{{ {rng.choice(tags)} }}}}'
+        lines.append(line)
+        size += len(line.encode('utf-8')) + 1
+
+    lines.append('')
+    lines.extend(f'- {{{{ {tag} }}}}' for tag in tags)
+    return '\n'.join(lines) + '\n'
+
+
+def generate_vault(
+    root: Path,
+    notes: int,
+    depth: int,
+    tags_per_note: int,
+    vocabulary_size: int,
+    note_size: int,
+    seed: int,
+) -> None:
+    """Создать синтетический каталог с заметками."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng, vocabulary_size)
+    folders = [root]
+
+    for number in range(notes):
+        parent = rng.choice(folders)
+        if len(parent.relative_to(root).parts) < depth and rng.random() < 0.05:
+            parent = parent / f'Раздел {make_word(rng)}'
+            parent.mkdir(exist_ok=True)
+            folders.append(parent)
+
+        tags = rng.sample(vocabulary, min(tags_per_note, len(vocabulary)))
+        content = make_note(rng, number, tags, note_size)
+        (parent / f'note_{number:06}.md').write_text(content, encoding='utf-8')
+
+
+def apply_churn(root: Path, share: float, seed: int) -> int:
+    """Изменить заданную долю заметок, вернуть количество изменённых."""
+    rng = random.Random(seed)
+    notes = sorted(
+        path
+        for path in root.rglob('*.md')
+        if constants.TAGS_FOLDER not in path.parts
+        and path.name != constants.README_FILENAME
+    )
+    changed = rng.sample(notes, max(1, int(len(notes) * share)))
+
+    for path in changed:
+        with open(path, mode='a', encoding='utf-8') as file:
+            file.write(f'\n{{{{ Новый тег {rng.randint(0, 9)} }}}}\n')
+
+    return len(changed)
+
+
+def get_peak_memory() -> int | None:
+    """Вернуть пиковый объём памяти процесса в байтах."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure_run(path: Path, settings: objects.Settings) -> dict[str, Any]:
+    """Выполнить одну обработку каталога и вернуть замеры.
+
+    Каждая обработка идёт в новом процессе: пиковая память процесса
+    не убывает, и в общем процессе каждый следующий замер показывал бы
+    максимум за все предыдущие. Память исполнителей --executor process
+    сюда не входит.
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_once, path, settings).result()
+
+
+def run_once(path: Path, settings: objects.Settings) -> dict[str, Any]:
+    """Обработать каталог в текущем процессе и вернуть замеры."""
+    metrics = metrics_module.Metrics()
+    start_time = time.perf_counter()
+
+    cache = objects.make_cache(path, settings)
+    with metrics.phase('cache_load'):
+        cache.load()
+    try:
+        runner.run(
+            path,
+            settings,
+            cache,
+            metrics=metrics,
+            reporter=output.Reporter(level='quiet'),
+        )
+    finally:
+        cache.close()
+
+    return {
+        'seconds': round(time.perf_counter() - start_time, 6),
+        **metrics.as_dict(),
+        'peak_memory': get_peak_memory(),
+    }
+
+
+def measure_rewrite(sizes: list[int], seed: int) -> list[dict[str, Any]]:
+    """Замерить замену тегов на документах растущего размера."""
+    rng = random.Random(seed)
+    tags = make_vocabulary(rng, 300)
+    results = []
+
+    for size in sizes:
+        lines = [
+            f'{make_word(rng)} {make_word(rng)} {{{{ {rng.choice(tags)} }}}}'
+            for _ in range(size // 40)
+        ]
+        content = '\n'.join(lines)
+        file = objects.File(
+            path=Path('folder', 'note.md'),
+            root=Path(),
+            content=content,
+        )
+        start_time = time.perf_counter()
+        markup.replace_bare_tags(file)
+        results.append({
+            'bytes': len(content.encode('utf-8')),
+            'seconds': round(time.perf_counter() - start_time, 6),
+        })
+
+    return results
+
+
+def parse_with_patterns(text: str) -> scanner.Scan:
+    """Разобрать текст шаблонами, по которым сверяется разбор."""
+    match = constants.TITLE_PATTERN.search(text)
+    return scanner.Scan(
+        title=None if match is None else match.group(1),
+        tags=[
+            (match.start(), match.end(), match.group(1))
+            for match in constants.BASIC_TAG_PATTERN.finditer(text)
+        ],
+        bare=[
+            (match.start(), match.end(), match.group(2))
+            for match in constants.BARE_TAG_PATTERN.finditer(text)
+        ],
+    )
+
+
+def as_names(result: scanner.Scan) -> tuple[Any, ...]:
+    """Вернуть результат разбора без границ тегов."""
+    return (
+        result.title,
+        [name for _, _, name in result.tags],
+        [name for _, _, name in result.bare],
+    )
+
+
+def check_scanner(cases: int, seed: int) -> dict[str, Any]:
+    """Сверить разбор с шаблонами на случайных текстах.
+
+    Строки сверяются вместе с границами тегов, байты - по тексту
+    тегов, как их видит разбор уже декодированного файла.
+    """
+    rng = random.Random(seed)
+    mismatches = []
+
+    for _ in range(cases):
+        text = ''.join(
+            rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 40))
+        )
+        expected = parse_with_patterns(text)
+        result = scanner.scan(text)
+
+        if (result.title, result.tags, result.bare) != (
+            expected.title,
+            expected.tags,
+            expected.bare,
+        ):
+            mismatches.append({'kind': 'text', 'text': text})
+
+        encoded = text.encode('utf-8')
+        expected = parse_with_patterns(utils.decode_text(encoded))
+        result = scanner.scan(encoded, scanner.BYTES)
+
+        if as_names(result) != as_names(expected):
+            mismatches.append({'kind': 'bytes', 'text': text})
+
+    return {
+        'cases': cases,
+        'mismatches': len(mismatches),
+        'examples': mismatches[:10],
+    }
+
+
+def measure_adversarial(sizes: list[int]) -> dict[str, list[dict[str, Any]]]:
+    """Замерить разбор на текстах с незакрытыми скобками.
+
+    Время разбора должно расти линейно с размером текста, время
+    шаблонов для сравнения растёт как минимум квадратично.
+    """
+    results: dict[str, list[dict[str, Any]]] = {}
+
+    for name, (make_text, pattern_limit) in ADVERSARIAL.items():
+        rows = []
+        for size in sizes:
+            text = make_text(size)
+            start_time = time.perf_counter()
+            result = scanner.scan(text)
+            row: dict[str, Any] = {
+                'bytes': len(text.encode('utf-8')),
+                'scanner_seconds': round(time.perf_counter() - start_time, 6),
+            }
+
+            if size <= pattern_limit:
+                start_time = time.perf_counter()
+                expected = parse_with_patterns(text)
+                row['pattern_seconds'] = round(
+                    time.perf_counter() - start_time,
+                    6,
+                )
+                row['same'] = (result.tags, result.bare) == (
+                    expected.tags,
+                    expected.bare,
+                )
+
+            rows.append(row)
+        results[name] = rows
+
+    return results
+
+
+def measure_scanner(cases: int, seed: int) -> dict[str, Any]:
+    """Сверить и замерить разбор заметок."""
+    return {
+        'fuzz': check_scanner(cases, seed),
+        'adversarial': measure_adversarial(
+            sizes=[250, 500, 1000, 2000, 16_000, 128_000],
+        ),
+    }
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Собрать парсер аргументов."""
+    parser = argparse.ArgumentParser(
+        prog='minimus.bench',
+        description='Замеры производительности minimus',
+    )
+    parser.add_argument('--notes', type=int, default=2000)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--tags-per-note', type=int, default=5)
+    parser.add_argument('--vocabulary', type=int, default=500)
+    parser.add_argument('--note-size', type=int, default=2000)
+    parser.add_argument('--churn', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=arguments.positive_int, default=1)
+    parser.add_argument(
+        '--executor',
+        choices=constants.EXECUTORS,
+        default='thread',
+    )
+    parser.add_argument(
+        '--cache',
+        choices=constants.CACHE_BACKENDS,
+        default='json',
+    )
+    parser.add_argument('--fuzz-cases', type=int, default=20_000)
+    parser.add_argument(
+        '--scanner',
+        action='store_true',
+        help='только сверка и замеры разбора заметок, без каталога',
+    )
+    parser.add_argument(
+        '--output',
+        type=Path,
+        default=None,
+        help='файл для результатов, по умолчанию вывод на экран',
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Точка входа."""
+    arguments = make_parser().parse_args(argv)
+    settings = objects.Settings(
+        jobs=arguments.jobs,
+        executor=arguments.executor,
+        cache=arguments.cache,
+    )
+    parameters = {
+        name: value
+        for name, value in vars(arguments).items()
+        if name != 'output'
+    }
+
+    if arguments.scanner:
+        report(
+            {
+                'python': platform.python_version(),
+                'parameters': parameters,
+                'scanner': measure_scanner(
+                    arguments.fuzz_cases,
+                    arguments.seed,
+                ),
+            },
+            arguments.output,
+        )
+        return
+
+    with tempfile.TemporaryDirectory(prefix='minimus_bench_') as folder:
+        root = Path(folder)
+        start_time = time.perf_counter()
+        generate_vault(
+            root=root,
+            notes=arguments.notes,
+            depth=arguments.depth,
+            tags_per_note=arguments.tags_per_note,
+            vocabulary_size=arguments.vocabulary,
+            note_size=arguments.note_size,
+            seed=arguments.seed,
+        )
+        generation = time.perf_counter() - start_time
+
+        cold = measure_run(root, settings)
+        warm = measure_run(root, settings)
+        changed = apply_churn(root, arguments.churn, arguments.seed)
+        churn = measure_run(root, settings)
+
+    result = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': parameters,
+        'generation_seconds': round(generation, 6),
+        'runs': {
+            'cold': cold,
+            'warm': warm,
+            'churn': {'changed_notes': changed, **churn},
+        },
+        'rewrite': measure_rewrite(
+            sizes=[100_000, 200_000, 400_000, 800_000],
+            seed=arguments.seed,
+        ),
+        'scanner': measure_scanner(arguments.fuzz_cases, arguments.seed),
+    }
+    report(result, arguments.output)
+
+
+def report(result: dict[str, Any], output_path: Path | None) -> None:
+    """Вывести результаты, при расхождении разбора завершиться ошибкой."""
+    text = json.dumps(result, ensure_ascii=False, indent=4)
+
+    if output_path is None:
+        print(text)
+    else:
+        output_path.write_text(text + '\n', encoding='utf-8')
+
+    if result['scanner']['fuzz']['mismatches']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+"""Модуль разбора аргументов командной строки.
+"""
+import argparse
+from pathlib import Path
+
+from minimus.src import constants
+from minimus.src import objects
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Собрать парсер аргументов."""
+    parser = argparse.ArgumentParser(
+        prog='minimus',
+        description='Связывание заметок между собой с помощью тегов',
+        epilog='Поиск по уже обработанному каталогу: '
+        'minimus query ВЫРАЖЕНИЕ [КАТАЛОГ] - по тегам, '
+        'minimus search СЛОВА [КАТАЛОГ] - по тексту заметок. '
+        'Правка тегов: minimus rename-tag СТАРЫЙ НОВЫЙ [КАТАЛОГ], '
+        'minimus merge-tags ЦЕЛЬ ТЕГ [ТЕГ ...] КАТАЛОГ',
+    )
+    parser.add_argument(
+        'paths',
+        nargs='*',
+        metavar='path',
+        help='корневые каталоги с заметками, по умолчанию текущий',
+    )
+    parser.add_argument(
+        '--manifest',
+        default=None,
+        help='файл со списком каталогов, по одному в строке; '
+        'относительные пути отсчитываются от каталога самого файла',
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='всегда сверять контрольные суммы, даже для нетронутых файлов',
+    )
+    parser.add_argument(
+        '--hash',
+        dest='algorithm',
+        choices=constants.HASH_ALGORITHMS,
+        default=constants.DEFAULT_HASH_ALGORITHM,
+        help='алгоритм контрольной суммы для поиска изменений',
+    )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='пересоздать документы всех тегов, даже если они не менялись',
+    )
+    parser.add_argument(
+        '--fsync',
+        action='store_true',
+        help='сбрасывать записанные файлы на диск перед завершением',
+    )
+    parser.add_argument(
+        '--jobs',
+        type=positive_int,
+        default=1,
+        help='количество параллельных исполнителей для обработки заметок',
+    )
+    parser.add_argument(
+        '--executor',
+        choices=constants.EXECUTORS,
+        default='thread',
+        help='вид пула исполнителей: потоки или процессы',
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='не завершаться, а обрабатывать изменения по мере появления',
+    )
+    parser.add_argument(
+        '--debounce',
+        type=non_negative_float,
+        default=0.2,
+        help='пауза в секундах, после которой пачка событий обрабатывается',
+    )
+    parser.add_argument(
+        '--stats',
+        choices=('text', 'json'),
+        default=None,
+        help='вывести время по этапам, счётчики файлов, байт и кеша',
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='запустить обработку под cProfile и вывести самые затратные '
+        'функции',
+    )
+    parser.add_argument(
+        '--cache',
+        choices=constants.CACHE_BACKENDS,
+        default='json',
+        help='где хранить кеш: в файле JSON или в базе SQLite',
+    )
+    parser.add_argument(
+        '--close-tags',
+        type=non_negative_int,
+        default=None,
+        help='сколько близких тегов показывать в документе тега, '
+        'начиная с самых частых соседей; по умолчанию все',
+    )
+    parser.add_argument(
+        '--page-size',
+        type=positive_int,
+        default=None,
+        help='сколько заметок выводить на одной странице документа тега; '
+        'по умолчанию все на одной странице',
+    )
+    parser.add_argument(
+        '--folder-index',
+        action='store_true',
+        help='вместо одного общего README писать оглавление README '
+        'в каждый каталог с заметками; без флага такие оглавления '
+        'удаляются',
+    )
+    parser.add_argument(
+        '--search-index',
+        dest='search',
+        action='store_true',
+        help='завести полнотекстовый индекс для minimus search; '
+        'дальше он обновляется при каждом запуске',
+    )
+    parser.add_argument(
+        '--git',
+        action='store_true',
+        help='искать изменённые заметки через git: заметки, которые git '
+        'считает нетронутыми, не проверяются вовсе',
+    )
+    parser.add_argument(
+        '--low-memory',
+        action='store_true',
+        help='держать в памяти как можно меньше: короткая очередь задач, '
+        'записи кеша SQLite выгружаются сразу после обработки',
+    )
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument(
+        '-q',
+        '--quiet',
+        dest='verbosity',
+        action='store_const',
+        const='quiet',
+        default='normal',
+        help='ничего не выводить, кроме явно запрошенных замеров',
+    )
+    verbosity.add_argument(
+        '-v',
+        '--verbose',
+        dest='verbosity',
+        action='store_const',
+        const='verbose',
+        help='сообщать о каждой заметке, в том числе нетронутой',
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=('text', 'json'),
+        default='text',
+        help='формат вывода: текст или события в виде строк JSON',
+    )
+    return parser
+
+
+def make_query_parser() -> argparse.ArgumentParser:
+    """Собрать парсер аргументов для поиска по тегам."""
+    parser = argparse.ArgumentParser(
+        prog='minimus query',
+        description='Поиск заметок по тегам без чтения самих заметок',
+    )
+    parser.add_argument(
+        'expression',
+        help='выражение из тегов: & - и, | - или, ! - не, скобки для '
+        'группировки, теги со спецсимволами берутся в двойные кавычки. '
+        'Например: "python & (код | машина) & !черновик"',
+    )
+    parser.add_argument(
+        'path',
+        nargs='?',
+        default='.',
+        help='корневой каталог с заметками',
+    )
+    parser.add_argument(
+        '-q',
+        '--quiet',
+        dest='verbosity',
+        action='store_const',
+        const='quiet',
+        default='normal',
+        help='выводить только найденные заметки',
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=('text', 'json'),
+        default='text',
+        help='формат вывода: текст или строки JSON',
+    )
+    return parser
+
+
+def make_search_parser() -> argparse.ArgumentParser:
+    """Собрать парсер аргументов для полнотекстового поиска."""
+    parser = argparse.ArgumentParser(
+        prog='minimus search',
+        description='Поиск заметок по словам в тексте',
+    )
+    parser.add_argument(
+        'text',
+        help='слова для поиска, регистр и буква ё не важны',
+    )
+    parser.add_argument(
+        'path',
+        nargs='?',
+        default='.',
+        help='корневой каталог с заметками',
+    )
+    parser.add_argument(
+        '--limit',
+        type=positive_int,
+        default=20,
+        help='сколько заметок показать, начиная с самых подходящих',
+    )
+    parser.add_argument(
+        '-q',
+        '--quiet',
+        dest='verbosity',
+        action='store_const',
+        const='quiet',
+        default='normal',
+        help='выводить только найденные заметки, без отрывков',
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=('text', 'json'),
+        default='text',
+        help='формат вывода: текст или строки JSON',
+    )
+    return parser
+
+
+def make_rename_parser() -> argparse.ArgumentParser:
+    """Собрать парсер аргументов для переименования тега."""
+    parser = argparse.ArgumentParser(
+        prog='minimus rename-tag',
+        description='Переименование тега во всех заметках и документах '
+        'тегов уже обработанного каталога',
+    )
+    parser.add_argument('old', help='текущее имя тега')
+    parser.add_argument(
+        'new',
+        help='новое имя тега; если такой тег уже есть, теги сольются',
+    )
+    parser.add_argument(
+        'path',
+        nargs='?',
+        default='.',
+        help='корневой каталог с заметками',
+    )
+    add_retag_output_arguments(parser)
+    return parser
+
+
+def make_merge_parser() -> argparse.ArgumentParser:
+    """Собрать парсер аргументов для слияния тегов."""
+    parser = argparse.ArgumentParser(
+        prog='minimus merge-tags',
+        description='Слияние нескольких тегов в один во всех заметках '
+        'и документах тегов уже обработанного каталога',
+    )
+    parser.add_argument(
+        'target',
+        help='тег, который останется; может быть и новым',
+    )
+    parser.add_argument(
+        'sources',
+        nargs='+',
+        help='теги, которые заменятся на него',
+    )
+    parser.add_argument(
+        'path',
+        help='корневой каталог с заметками; обязателен, иначе его '
+        'нельзя отличить от последнего тега',
+    )
+    add_retag_output_arguments(parser)
+    return parser
+
+
+def add_retag_output_arguments(parser: argparse.ArgumentParser) -> None:
+    """Добавить настройки вывода для команд правки тегов."""
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument(
+        '-q',
+        '--quiet',
+        dest='verbosity',
+        action='store_const',
+        const='quiet',
+        default='normal',
+        help='ничего не выводить',
+    )
+    verbosity.add_argument(
+        '-v',
+        '--verbose',
+        dest='verbosity',
+        action='store_const',
+        const='verbose',
+        help='сообщать и о заметках, в которых ничего не поменялось',
+    )
+    parser.add_argument(
+        '--format',
+        dest='output_format',
+        choices=('text', 'json'),
+        default='text',
+        help='формат вывода: текст или строки JSON',
+    )
+
+
+def positive_int(text: str) -> int:
+    """Разобрать целое число не меньше единицы."""
+    value = int(text)
+    if value < 1:
+        msg = f'ожидается число не меньше 1, получено {value}'
+        raise argparse.ArgumentTypeError(msg)
+    return value
+
+
+def non_negative_int(text: str) -> int:
+    """Разобрать целое число не меньше нуля."""
+    value = int(text)
+    if value < 0:
+        msg = f'ожидается число не меньше 0, получено {value}'
+        raise argparse.ArgumentTypeError(msg)
+    return value
+
+
+def non_negative_float(text: str) -> float:
+    """Разобрать число не меньше нуля."""
+    value = float(text)
+    if not value >= 0:
+        msg = f'ожидается число не меньше 0, получено {text}'
+        raise argparse.ArgumentTypeError(msg)
+    return value
+
+
+def read_manifest(manifest: str) -> list[str]:
+    """Прочитать список каталогов, пропуская пустые строки и комментарии."""
+    manifest_path = Path(manifest)
+    paths = []
+
+    with open(manifest_path, mode='r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                paths.append(str(manifest_path.parent / Path(line)))
+
+    return paths
+
+
+def parse_arguments(
+    argv: list[str] | None = None,
+) -> tuple[list[str], objects.Settings]:
+    """Вернуть пути до каталогов и настройки запуска."""
+    parser = make_parser()
+    # каталоги могут идти и после ключей
+    arguments = parser.parse_intermixed_args(argv)
+    paths = list(arguments.paths)
+
+    if arguments.manifest is not None:
+        try:
+            paths.extend(read_manifest(arguments.manifest))
+        except OSError as exc:
+            parser.error(f'Не удалось прочитать список каталогов: {exc}')
+
+    paths = list(dict.fromkeys(paths)) or ['.']
+
+    if arguments.watch and len(paths) > 1:
+        parser.error('--watch работает только с одним каталогом')
+
+    settings = objects.Settings(
+        verify=arguments.verify,
+        algorithm=arguments.algorithm,
+        rebuild=arguments.rebuild,
+        fsync=arguments.fsync,
+        jobs=arguments.jobs,
+        executor=arguments.executor,
+        watch=arguments.watch,
+        debounce=arguments.debounce,
+        stats=arguments.stats,
+        profile=arguments.profile,
+        cache=arguments.cache,
+        verbosity=arguments.verbosity,
+        output_format=arguments.output_format,
+        low_memory=arguments.low_memory,
+        close_tags=arguments.close_tags,
+        search=arguments.search,
+        page_size=arguments.page_size,
+        folder_index=arguments.folder_index,
+        git=arguments.git,
+    )
+    return paths, settings
@@ -17,6 +17,35 @@ UNKNOWN = '???'
 README_FILENAME = 'README.md'
 CACHE_FILENAME = '.minimus_cache.json'
 TAGS_FOLDER = '__tags'
+CACHE_VERSION = 3
+SQLITE_CACHE_FILENAME = '.minimus_cache.sqlite'
+SQLITE_CACHE_VERSION = 1
+CACHE_BACKENDS = ('json', 'sqlite')
+INDEX_FILENAME = '.minimus_index.json'
+INDEX_VERSION = 1
+SEARCH_INDEX_FILENAME = '.minimus_search.sqlite'
+SEARCH_INDEX_VERSION = 1
+SNAPSHOT_FILENAME = '.minimus_snapshot.json'
+SNAPSHOT_VERSION = 1
+
+# Алгоритмы для вычисления контрольной суммы файлов
+# crc32 и adler32 не криптографические, зато самые быстрые
+HASH_ALGORITHMS = (
+    'md5',
+    'sha1',
+    'sha256',
+    'blake2b',
+    'blake2s',
+    'crc32',
+    'adler32',
+)
+DEFAULT_HASH_ALGORITHM = 'md5'
+
+# Виды пулов для параллельной обработки заметок
+EXECUTORS = ('thread', 'process')
+
+# Период опроса файловой системы в режиме наблюдения без inotify, сек.
+POLL_INTERVAL = 1.0
 
 IGNORED_PREFIXES = (
     '~',
@@ -69,6 +98,9 @@ BIG_LETTERS = {
 
 TRANS_MAP = str.maketrans({**SMALL_LETTERS, **BIG_LETTERS})
 
+# Заметки разбирает модуль scanner за один проход, шаблоны ниже
+# описывают то же поведение и служат эталоном для сверки с ним
+
 # Базовый шаблон для тега, любые включения в документ
 # Примеры: '{{ something }}', '[{{ tag }}](./tag.md)'
 BASIC_TAG_PATTERN = re.compile(
@@ -108,3 +140,17 @@ BARE_TAG_PATTERN = re.compile(
 """,
     flags=re.VERBOSE,
 )
+
+# Файлы не меньше этого размера читаются через mmap
+MMAP_THRESHOLD = 1024 * 1024
+
+# Пробел в байтах файла в кодировке UTF-8: любой символ,
+# который \s находит в строке
+UTF8_SPACE = (
+    rb'(?:[\t\n\x0b\x0c\r\x1c-\x1f ]'
+    rb'|\xc2[\x85\xa0]'
+    rb'|\xe1\x9a\x80'
+    rb'|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]'
+    rb'|\xe2\x81\x9f'
+    rb'|\xe3\x80\x80)'
+)
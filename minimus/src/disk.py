@@ -0,0 +1,205 @@
+"""Модуль записи файлов на диск.
+"""
+from contextlib import suppress
+import os
+from pathlib import Path
+import secrets
+from types import TracebackType
+
+
+# Размер, время изменения и inode файла
+Signature = tuple[int, int, int]
+
+
+def get_signature(path: str | Path) -> Signature | None:
+    """Вернуть размер, время изменения и inode файла, None если его нет."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def encode(content: str) -> bytes:
+    """Вернуть байты, которые будут записаны на диск для этого текста."""
+    if os.linesep != '\n':
+        content = content.replace('\n', os.linesep)
+    return content.encode('utf-8')
+
+
+class Writer:
+    """Запись файлов с подсчётом статистики.
+
+    Файлы с неизменившимся содержимым не перезаписываются. Запись идёт
+    во временный файл рядом с целевым, который затем подменяет целевой
+    через os.replace, поэтому прерванный запуск не оставляет
+    обрезанных файлов. При включённом fsync каталоги синхронизируются
+    одним пакетом в методе flush. В written запоминается, какими
+    записанные и удалённые файлы остались после записи, чтобы
+    наблюдение за каталогом могло отличить их от чужих изменений.
+    """
+
+    def __init__(self, fsync: bool = False) -> None:
+        """Инициализировать экземпляр."""
+        self.fsync = fsync
+        self.files_written = 0
+        self.files_skipped = 0
+        self.bytes_written = 0
+        self.written: dict[Path, Signature | None] = {}
+        self._folders: set[Path] = set()
+
+    def write(self, path: Path, content: str | bytes) -> bool:
+        """Записать файл, вернуть True если он действительно изменился."""
+        if isinstance(content, str):
+            content = encode(content)
+
+        path = Path(os.path.realpath(path))
+
+        if self._same_content(path, content):
+            self.files_skipped += 1
+            return False
+
+        temp_path = path.with_name(f'.{path.name}.{secrets.token_hex(4)}.tmp')
+        descriptor = os.open(
+            temp_path,
+            os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0),
+            0o666,
+        )
+
+        try:
+            with os.fdopen(descriptor, mode='wb') as file:
+                file.write(content)
+                if self.fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+
+            with suppress(FileNotFoundError):
+                os.chmod(temp_path, os.stat(path).st_mode)
+
+            os.replace(temp_path, path)
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.unlink(temp_path)
+            raise
+
+        if self.fsync:
+            self._folders.add(path.parent)
+
+        self.files_written += 1
+        self.bytes_written += len(content)
+        self.written[path] = get_signature(path)
+        return True
+
+    def delete(self, path: Path) -> None:
+        """Удалить файл, если он существует."""
+        Path(path).unlink(missing_ok=True)
+        self.written[Path(os.path.realpath(path))] = None
+
+    def record(self, path: Path, size: int) -> bool:
+        """Учесть файл, записанный в обход write, например базу SQLite.
+
+        size - сколько байт данных в него записано, ноль - если он
+        не менялся. Возвращает True если файл изменился.
+        """
+        if not size:
+            self.files_skipped += 1
+            return False
+
+        path = Path(os.path.realpath(path))
+        self.files_written += 1
+        self.bytes_written += size
+        self.written[path] = get_signature(path)
+        return True
+
+    def merge(self, other: 'Writer') -> None:
+        """Добавить к себе статистику другого экземпляра."""
+        self.files_written += other.files_written
+        self.files_skipped += other.files_skipped
+        self.bytes_written += other.bytes_written
+        self.written.update(other.written)
+        self._folders.update(other._folders)
+
+    @staticmethod
+    def _same_content(path: Path, content: bytes) -> bool:
+        """Вернуть True если на диске уже лежит точно такое же содержимое."""
+        try:
+            if os.stat(path).st_size != len(content):
+                return False
+            with open(path, mode='rb') as file:
+                return file.read() == content
+        except (FileNotFoundError, IsADirectoryError):
+            return False
+
+    def flush(self) -> None:
+        """Синхронизировать с диском каталоги, в которые шла запись."""
+        if os.name == 'nt':
+            self._folders.clear()
+            return
+
+        for folder in sorted(self._folders):
+            descriptor = os.open(folder, os.O_RDONLY)
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+
+        self._folders.clear()
+
+
+class Transaction(Writer):
+    """Запись группы файлов целиком или никак.
+
+    Перед первой записью или удалением файла его прежнее содержимое
+    запоминается. Если внутри блока with возникла ошибка, в том числе
+    прерывание с клавиатуры, все уже сделанные изменения откатываются.
+    """
+
+    def __init__(self, fsync: bool = False) -> None:
+        """Инициализировать экземпляр."""
+        super().__init__(fsync)
+        self._originals: dict[Path, bytes | None] = {}
+
+    def __enter__(self) -> 'Transaction':
+        """Начать транзакцию."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Откатить изменения, если блок завершился ошибкой."""
+        if exc_type is not None:
+            self.rollback()
+
+    def _remember(self, path: Path) -> None:
+        """Запомнить содержимое файла до первого изменения."""
+        path = Path(os.path.realpath(path))
+        if path in self._originals:
+            return
+
+        try:
+            self._originals[path] = path.read_bytes()
+        except FileNotFoundError:
+            self._originals[path] = None
+
+    def write(self, path: Path, content: str | bytes) -> bool:
+        """Записать файл, запомнив его прежнее содержимое."""
+        self._remember(path)
+        return super().write(path, content)
+
+    def delete(self, path: Path) -> None:
+        """Удалить файл, запомнив его прежнее содержимое."""
+        self._remember(path)
+        super().delete(path)
+
+    def rollback(self) -> None:
+        """Вернуть все изменённые файлы в прежнее состояние."""
+        for path, content in reversed(self._originals.items()):
+            if content is None:
+                super().delete(path)
+            else:
+                super().write(path, content)
+
+        self._originals.clear()
@@ -0,0 +1,249 @@
+"""Модуль обратного индекса тегов.
+"""
+import json
+from pathlib import Path
+import re
+from typing import Iterator
+
+from minimus.src import constants
+from minimus.src import disk
+from minimus.src import objects
+from minimus.src import tags
+
+QUERY_TOKEN_PATTERN = re.compile(
+    r'\s*(?:(?P<operator>[&|!()])|"(?P<quoted>[^"]*)"|(?P<tag>[^&|!()"]+))'
+)
+
+
+class QueryError(ValueError):
+    """Ошибка в выражении запроса."""
+
+
+class TagIndex:
+    """Обратный индекс: для каждого тега номера заметок с ним.
+
+    Номер заметки - её позиция в отсортированном списке заметок.
+    Для вычисления запросов списки номеров превращаются в битовые
+    маски, поэтому пересечение и объединение стоят одной операции
+    над целыми числами.
+    """
+
+    def __init__(
+        self,
+        tag_names: list[str],
+        notes: list[tuple[str, str, list[int]]],
+        postings: list[list[int]],
+    ) -> None:
+        """Инициализировать экземпляр."""
+        self.tag_names = tag_names
+        self.notes = notes
+        self.postings = postings
+        self.ids = {tag: tag_id for tag_id, tag in enumerate(tag_names)}
+        self._bitmaps: dict[int, int] = {}
+
+    @classmethod
+    def from_table(
+        cls,
+        tag_table: tags.TagTable,
+        notes: list[objects.Note],
+    ) -> 'TagIndex':
+        """Собрать индекс по таблице тегов и списку заметок."""
+        note_ids = {note: note_id for note_id, note in enumerate(notes)}
+        postings = [
+            [note_ids[note] for note in tagged]
+            for tagged in tag_table.notes
+        ]
+        indexed_notes = [
+            (
+                note.relative_path.as_posix(),
+                note.title,
+                sorted({tag_table.ids[tag] for tag in note.tags}),
+            )
+            for note in notes
+        ]
+        return cls(list(tag_table.names), indexed_notes, postings)
+
+    @classmethod
+    def load(cls, path: Path) -> 'TagIndex | None':
+        """Прочитать индекс каталога, вернуть None если его нет."""
+        full_path = path / constants.INDEX_FILENAME
+
+        try:
+            with open(full_path, mode='r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.decoder.JSONDecodeError):
+            return None
+
+        if data.get('version') != constants.INDEX_VERSION:
+            return None
+
+        return cls(
+            tag_names=data['tags'],
+            notes=[tuple(note) for note in data['notes']],
+            postings=data['postings'],
+        )
+
+    def save(self, path: Path, writer: disk.Writer) -> bool:
+        """Сохранить индекс рядом с кешем, вернуть True если он изменился."""
+        full_path = path / constants.INDEX_FILENAME
+        data = {
+            'version': constants.INDEX_VERSION,
+            'tags': self.tag_names,
+            'notes': self.notes,
+            'postings': self.postings,
+        }
+        return writer.write(
+            full_path,
+            json.dumps(data, ensure_ascii=False, separators=(',', ':')),
+        )
+
+    def bitmap(self, tag: str) -> int:
+        """Вернуть битовую маску заметок с тегом."""
+        tag_id = self.ids.get(tag)
+
+        if tag_id is None:
+            return 0
+
+        bitmap = self._bitmaps.get(tag_id)
+
+        if bitmap is None:
+            raw = bytearray((len(self.notes) + 7) // 8)
+            for note_id in self.postings[tag_id]:
+                raw[note_id >> 3] |= 1 << (note_id & 7)
+            bitmap = int.from_bytes(raw, 'little')
+            self._bitmaps[tag_id] = bitmap
+
+        return bitmap
+
+    def query(self, expression: str) -> list[int]:
+        """Вернуть номера заметок, подходящих под выражение.
+
+        Поддерживаются операторы & (и), | (или), ! (не) и скобки.
+        Теги с пробелами пишутся как есть, теги со спецсимволами -
+        в двойных кавычках.
+        """
+        parser = QueryParser(self, expression)
+        return list(iter_bits(parser.parse()))
+
+
+class QueryParser:
+    """Разбор выражения запроса методом рекурсивного спуска.
+
+    Выражение вычисляется сразу при разборе, результат - битовая маска.
+    """
+
+    def __init__(self, tag_index: TagIndex, expression: str) -> None:
+        """Инициализировать экземпляр."""
+        self.tag_index = tag_index
+        self.tokens = list(tokenize(expression))
+        self.position = 0
+        self.everything = (1 << len(tag_index.notes)) - 1
+
+    def parse(self) -> int:
+        """Вычислить всё выражение."""
+        if not self.tokens:
+            raise QueryError('Пустой запрос')
+
+        result = self._parse_or()
+
+        if self.position < len(self.tokens):
+            _, value = self.tokens[self.position]
+            raise QueryError(f'Неожиданный элемент запроса: {value!r}')
+
+        return result
+
+    def _peek(self) -> tuple[str, str] | None:
+        """Вернуть текущий элемент, не сдвигаясь."""
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def _parse_or(self) -> int:
+        """Разобрать объединение."""
+        result = self._parse_and()
+
+        while self._peek() == ('operator', '|'):
+            self.position += 1
+            result |= self._parse_and()
+
+        return result
+
+    def _parse_and(self) -> int:
+        """Разобрать пересечение."""
+        result = self._parse_not()
+
+        while self._peek() == ('operator', '&'):
+            self.position += 1
+            result &= self._parse_not()
+
+        return result
+
+    def _parse_not(self) -> int:
+        """Разобрать отрицание."""
+        if self._peek() == ('operator', '!'):
+            self.position += 1
+            return self.everything & ~self._parse_not()
+
+        return self._parse_atom()
+
+    def _parse_atom(self) -> int:
+        """Разобрать тег или выражение в скобках."""
+        token = self._peek()
+
+        if token is None:
+            raise QueryError('Запрос оборвался на середине')
+
+        kind, value = token
+        self.position += 1
+
+        if kind == 'tag':
+            return self.tag_index.bitmap(value)
+
+        if value == '(':
+            result = self._parse_or()
+            if self._peek() != ('operator', ')'):
+                raise QueryError('Не хватает закрывающей скобки')
+            self.position += 1
+            return result
+
+        raise QueryError(f'Неожиданный элемент запроса: {value!r}')
+
+
+def tokenize(expression: str) -> Iterator[tuple[str, str]]:
+    """Разбить выражение запроса на операторы и теги.
+
+    >>> list(tokenize('a b & !"x+y"'))
+    [('tag', 'a b'), ('operator', '&'), ('operator', '!'), ('tag', 'x+y')]
+    """
+    position = 0
+    expression = expression.rstrip()
+
+    while position < len(expression):
+        match = QUERY_TOKEN_PATTERN.match(expression, position)
+
+        if match is None:
+            rest = expression[position:].strip()
+            raise QueryError(f'Не удалось разобрать запрос: {rest!r}')
+
+        position = match.end()
+
+        if match.group('operator') is not None:
+            yield 'operator', match.group('operator')
+        elif match.group('quoted') is not None:
+            yield 'tag', match.group('quoted')
+        else:
+            yield 'tag', match.group('tag').strip()
+
+
+def iter_bits(bitmap: int) -> Iterator[int]:
+    """Выдать номера установленных битов по возрастанию.
+
+    >>> list(iter_bits(0b10110))
+    [1, 2, 4]
+    """
+    bits = bin(bitmap)[:1:-1]
+    position = bits.find('1')
+
+    while position != -1:
+        yield position
+        position = bits.find('1', position + 1)
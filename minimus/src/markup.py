@@ -1,6 +1,7 @@
 """Модуль обработки текста.
 """
 from collections import defaultdict
+import hashlib
 from pathlib import Path
 
 from minimus.src import constants
@@ -13,56 +14,119 @@ def get_tag_filename(text: str) -> str:
     return utils.transliterate(text) + '.md'
 
 
-def gather_tags_from_files(
-    files: list[objects.File],
-) -> tuple[dict[str, set[objects.File]], dict[str, set[str]]]:
-    """Собрать словарь из соответствия тег-файлы."""
-    found_tags: dict[str, set[objects.File]] = defaultdict(set)
-    neighbours: dict[str, set[str]] = defaultdict(set)
+def make_tag_digest(
+    tag: str,
+    files: list[objects.Note],
+    close_tags: list[tuple[str, str]],
+    page_size: int | None = None,
+) -> str:
+    """Вернуть отпечаток всего, от чего зависит документ тега."""
+    digest = hashlib.md5(tag.encode('utf-8'))
+
+    if page_size:
+        digest.update(f'\t{page_size}'.encode('utf-8'))
 
     for file in files:
-        for tag in file.tags:
-            found_tags[tag].add(file)
-            neighbours[tag].update(x for x in file.tags if x != tag)
+        digest.update(f'\n{file.relative_path}\t{file.title}'.encode('utf-8'))
 
-    return found_tags, neighbours
+    digest.update(b'\n')
+    for close_tag, filename in close_tags:
+        digest.update(f'\n{close_tag}\t{filename}'.encode('utf-8'))
 
+    return digest.hexdigest()
 
-def make_tag_content(
-    tag: str,
-    files: list[objects.File],
-    neighbours: dict[str, set[str]],
-) -> str:
-    """Собрать документ для описания тега."""
-    lines = [
-        f'# {tag}\n',
-        '### Встречается в:\n',
-    ]
-
-    for number, file in utils.numerate(files):
-        file_path = file.path.relative_to(file.root)
-        link = as_href(
-            title=file.title,
-            link=escape(f'../{file_path}'),
-        )
-        lines.append(f'{number}. {link}\n')
 
-    close_tags = neighbours.get(tag)
+def get_tag_page_filename(filename: str, page: int) -> str:
+    """Вернуть имя файла для страницы документа тега.
 
-    if close_tags:
-        lines.append('\n### Близкие теги:\n')
-        sorted_close_tags = sorted(close_tags)
+    Первая страница лежит под обычным именем, чтобы ссылки из заметок
+    не зависели от разбиения на страницы.
 
-        for number, tag in utils.numerate(sorted_close_tags):
-            filename = get_tag_filename(tag)
-            full_path = Path(constants.TAGS_FOLDER) / filename
+    >>> get_tag_page_filename('kot.md', 1)
+    'kot.md'
+    >>> get_tag_page_filename('kot.md', 3)
+    'kot~3.md'
+    """
+    if page == 1:
+        return filename
+    return f'{filename.removesuffix(".md")}~{page}.md'
+
+
+def make_tag_pages(
+    tag: str,
+    files: list[objects.Note],
+    close_tags: list[tuple[str, str]],
+    filename: str,
+    page_size: int | None = None,
+) -> list[str]:
+    """Собрать документ для описания тега, по странице на элемент списка.
+
+    Близкие теги передаются уже упорядоченными, вместе с именами файлов,
+    и выводятся только на первой странице.
+    """
+    total = len(files)
+    page_size = page_size or total or 1
+    chunks = [
+        files[start:start + page_size]
+        for start in range(0, total, page_size)
+    ] or [[]]
+    prefix = utils.make_prefix(total)
+    pages = []
+
+    for page, chunk in enumerate(chunks, start=1):
+        lines = [
+            f'# {tag}\n',
+            '### Встречается в:\n',
+        ]
+
+        start = (page - 1) * page_size + 1
+        for position, file in enumerate(chunk, start=start):
+            number = prefix.format(num=position, total=total)
             link = as_href(
-                title=tag,
-                link=escape(f'../{full_path}'),
+                title=file.title,
+                link=escape(f'../{file.relative_path}'),
             )
             lines.append(f'{number}. {link}\n')
 
-    return '\n'.join(lines) + '\n'
+        if len(chunks) > 1:
+            lines.append('\n### Страницы:\n')
+            lines.append(make_page_navigation(filename, page, len(chunks)))
+
+        if close_tags and page == 1:
+            lines.append('\n### Близкие теги:\n')
+
+            for number, (close_tag, close_filename) in utils.numerate(
+                close_tags
+            ):
+                full_path = Path(constants.TAGS_FOLDER) / close_filename
+                link = as_href(
+                    title=close_tag,
+                    link=escape(f'../{full_path}'),
+                )
+                lines.append(f'{number}. {link}\n')
+
+        pages.append('\n'.join(lines) + '\n')
+
+    return pages
+
+
+def make_page_navigation(filename: str, current: int, pages: int) -> str:
+    """Собрать строку со ссылками на все страницы документа тега.
+
+    >>> make_page_navigation('kot.md', 2, 3)
+    '[1](../__tags/kot.md) | **2** | [3](../__tags/kot~3.md)\\n'
+    """
+    links = []
+
+    for page in range(1, pages + 1):
+        if page == current:
+            links.append(f'**{page}**')
+        else:
+            page_filename = get_tag_page_filename(filename, page)
+            full_path = Path(constants.TAGS_FOLDER) / page_filename
+            links.append(as_href(str(page), escape(f'../{full_path}')))
+
+    return ' | '.join(links) + '\n'
 
 
 def escape(link: str) -> str:
@@ -80,19 +144,16 @@ def as_href(title: str, link: str) -> str:
     return f'[{title}]({link})'
 
 
-def make_readme_content(files: list[objects.File]) -> str:
+def make_readme_content(files: list[objects.Note]) -> str:
     """Собрать содержимое головного файла README."""
     lines = [f'# Всего записей: {len(files)} шт.\n']
 
     category: list[str] = []
 
     for file in files:
-        folder = file.path.parent.relative_to(file.root)
-        file_path = file.path.relative_to(file.root)
-
         link = as_href(
             title=file.title,
-            link=escape(f'./{file_path}'),
+            link=escape(f'./{file.relative_path}'),
         )
         prefix = '\t' * len(category)
         lines.append(f'{prefix}- {link}\n')
@@ -100,35 +161,173 @@ def make_readme_content(files: list[objects.File]) -> str:
     return '\n'.join(lines) + '\n'
 
 
+def make_folder_indexes(files: list[objects.Note]) -> dict[Path, str]:
+    """Собрать оглавления README для каждого каталога с заметками.
+
+    Ключ - путь до каталога относительно корня. Оглавление перечисляет
+    заметки самого каталога и ссылается на оглавления вложенных
+    каталогов, поэтому правка в одном каталоге меняет только его
+    оглавление и счётчики у родителей.
+    """
+    root = Path()
+    notes: dict[Path, list[objects.Note]] = defaultdict(list)
+    subfolders: dict[Path, set[Path]] = defaultdict(set)
+    totals: dict[Path, int] = defaultdict(int)
+    totals[root] = 0
+
+    for file in files:
+        folder = file.relative_path.parent
+        notes[folder].append(file)
+        totals[folder] += 1
+
+        while folder != root:
+            subfolders[folder.parent].add(folder)
+            folder = folder.parent
+            totals[folder] += 1
+
+    indexes = {}
+    for folder, total in totals.items():
+        if folder == root:
+            lines = [f'# Всего записей: {total} шт.\n']
+        else:
+            lines = [
+                f'# {folder.name}\n',
+                f'Всего записей: {total} шт.\n',
+                as_href('Наверх', f'../{constants.README_FILENAME}') + '\n',
+            ]
+
+        for subfolder in sorted(subfolders[folder]):
+            link = as_href(
+                title=f'{subfolder.name}/',
+                link=escape(
+                    f'./{subfolder.name}/{constants.README_FILENAME}'
+                ),
+            )
+            lines.append(f'- {link} - {totals[subfolder]} шт.\n')
+
+        for file in notes[folder]:
+            link = as_href(
+                title=file.title,
+                link=escape(f'./{file.relative_path.name}'),
+            )
+            lines.append(f'- {link}\n')
+
+        indexes[folder] = '\n'.join(lines) + '\n'
+
+    return indexes
+
+
 def replace_bare_tags(file: objects.File) -> str:
     """Заменить теги на ссылки.
 
     Работает только для тех тегов, которые оформлены как простой текст.
-    Есть риск, что replace очень медленный, но пока предполагаем,
-    что файлы у нас не очень большие.
+    Границы тегов берутся из разбора файла, ссылка на каждый тег
+    вычисляется только при первой встрече.
+    """
+    links: dict[str, str] = {}
+    content = file.content
+    parts: list[str] = []
+    position = 0
+
+    for start, end, text in file.parsed.bare:
+        link = links.get(text)
+
+        if link is None:
+            tag_filename = get_tag_filename(text)
+            link = as_href(
+                title=f'{{{{ {text} }}}}',
+                link=get_relative_path_for_tag(
+                    file.root,
+                    file.path,
+                    tag_filename,
+                ),
+            )
+            links[text] = link
+
+        parts.append(content[position:start])
+        parts.append(link)
+        position = end
+
+    parts.append(content[position:])
+    return ''.join(parts)
+
+
+def rename_tags(file: objects.File, renames: dict[str, str]) -> str:
+    """Переименовать теги в тексте заметки.
+
+    Теги простым текстом и уже оформленные ссылками заменяются за один
+    проход по результатам разбора файла: на их месте появляется ссылка
+    на документ нового тега.
     """
     content = file.content
-    already_replaced: set[str] = set()
+    parts: list[str] = []
+    position = 0
 
-    for tag in constants.BARE_TAG_PATTERN.finditer(file.content):
-        prefix = tag.groups()[0]
-        text = tag.groups()[1]
-        suffix = tag.groups()[2]
+    for start, end, text in file.parsed.tags:
+        new_text = renames.get(text)
 
-        if text in already_replaced:
+        if new_text is None or start < position:
             continue
 
-        text_before = prefix + text + suffix
-        tag_filename = get_tag_filename(text)
-        link = get_relative_path_for_tag(file.root, file.path, tag_filename)
-        text_after = as_href(
-            title=f'{{{{ {text} }}}}',
-            link=link,
+        replacement = as_href(
+            title=f'{{{{ {new_text} }}}}',
+            link=get_relative_path_for_tag(
+                file.root,
+                file.path,
+                get_tag_filename(new_text),
+            ),
+        )
+        old_link = get_relative_path_for_tag(
+            file.root,
+            file.path,
+            get_tag_filename(text),
         )
-        content = content.replace(text_before, text_after)
-        already_replaced.add(text)
+        link_end = _find_link_end(content, start, end, old_link)
+
+        if link_end is not None:
+            start, end = start - 1, link_end
+        elif content[start - 1:start] == '[' or content[end:end + 1] == ']':
+            # тег в квадратных скобках, но не ссылка: меняется только имя
+            replacement = f'{{{{ {new_text} }}}}'
+
+        parts.append(content[position:start])
+        parts.append(replacement)
+        position = end
+
+    parts.append(content[position:])
+    return ''.join(parts)
+
+
+def _find_link_end(
+    content: str,
+    start: int,
+    end: int,
+    expected: str,
+) -> int | None:
+    """Вернуть конец ссылки вокруг тега, None если тег не ссылка.
+
+    Обычно ссылка ведёт туда, куда её поставила программа, тогда
+    в адресе могут быть и круглые скобки. Иначе адресом считается
+    всё до первой закрывающей скобки в той же строке.
+
+    >>> _find_link_end('[{{ f }}](./__tags/f(x).md)', 1, 8, './__tags/f(x).md')
+    27
+    >>> _find_link_end('[{{ a }}](../a.md) b', 1, 8, './__tags/a.md')
+    18
+    """
+    if content[start - 1:start] != '[' or content[end:end + 2] != '](':
+        return None
+
+    if content.startswith(f'{expected})', end + 2):
+        return end + 3 + len(expected)
 
-    return content
+    closing = content.find(')', end + 2)
+    newline = content.find('\n', end + 2)
+
+    if closing == -1 or newline != -1 and newline < closing:
+        return None
+
+    return closing + 1
 
 
 def get_relative_path_for_tag(
@@ -137,16 +336,43 @@ def get_relative_path_for_tag(
     tag_filename: str,
 ) -> str:
     """Вернуть относительный путь от файла до указанного тега."""
-    from_root = file_path.parent.relative_to(root)
-    hops = len(from_root.parts)
+    hops = get_hops(file_path.relative_to(root))
+    return get_tags_prefix(hops) + tag_filename
+
+
+def get_hops(relative_path: Path) -> int:
+    """Вернуть глубину вложенности заметки относительно корня.
+
+    >>> get_hops(Path('note.md')), get_hops(Path('a/b/note.md'))
+    (0, 2)
+    """
+    return len(relative_path.parent.parts)
 
-    path = f'{constants.TAGS_FOLDER}/{tag_filename}'
 
+def get_tags_prefix(hops: int) -> str:
+    """Вернуть начало пути до документов тегов с заданной глубины.
+
+    >>> get_tags_prefix(0), get_tags_prefix(2)
+    ('./__tags/', '../../__tags/')
+    """
     if hops == 0:
-        path = f'./{path}'
+        return f'./{constants.TAGS_FOLDER}/'
+    return '../' * hops + f'{constants.TAGS_FOLDER}/'
 
-    else:
-        for _ in range(hops):
-            path = f'../{path}'
 
-    return path
+def move_tag_links(content: str, old_hops: int, new_hops: int) -> str:
+    """Пересчитать ссылки на теги у заметки, перенесённой на другую глубину.
+
+    Меняется только начало адреса в ссылках, которые ведут из тега
+    в каталог тегов, сам текст заново не разбирается.
+
+    >>> move_tag_links('[{{ кот }}](./__tags/kot.md)', 0, 2)
+    '[{{ кот }}](../../__tags/kot.md)'
+    """
+    if old_hops == new_hops:
+        return content
+
+    return content.replace(
+        '}}](' + get_tags_prefix(old_hops),
+        '}}](' + get_tags_prefix(new_hops),
+    )
@@ -0,0 +1,67 @@
+"""Модуль замеров производительности.
+"""
+from contextlib import contextmanager
+import time
+from typing import Iterable
+from typing import Iterator
+from typing import TypeVar
+
+T = TypeVar('T')
+
+
+class Metrics:
+    """Замеры времени по этапам обработки и счётчики.
+
+    Этапы, которые выполняются в пуле исполнителей, суммируются
+    по всем исполнителям, поэтому при --jobs больше одного их сумма
+    может превышать общее время работы.
+    """
+
+    def __init__(self) -> None:
+        """Инициализировать экземпляр."""
+        self.phases: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Засечь время выполнения этапа."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def timed(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Засчитывать в этап время получения каждого элемента."""
+        iterator = iter(iterable)
+
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Увеличить счётчик."""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other: 'Metrics') -> None:
+        """Добавить к себе замеры другого экземпляра."""
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+        for name, value in other.counters.items():
+            self.count(name, value)
+
+    def as_dict(self) -> dict[str, dict[str, float] | dict[str, int]]:
+        """Вернуть замеры в виде словаря."""
+        return {
+            'phases': {
+                name: round(seconds, 6)
+                for name, seconds in self.phases.items()
+            },
+            'counters': dict(self.counters),
+        }
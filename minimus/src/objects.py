@@ -1,26 +1,87 @@
 """Модуль с классами объектов.
 """
 from functools import cached_property
-import hashlib
 import json
+import mmap
 import os
 from pathlib import Path
+import sqlite3
+import sys
 from typing import Any
+from typing import Iterable
 from typing import TypedDict
 from typing import cast
 
 from minimus.src import constants
+from minimus.src import disk
+from minimus.src import scanner
+from minimus.src import utils
+
+
+class Settings:
+    """Настройки запуска."""
+
+    def __init__(
+        self,
+        verify: bool = False,
+        algorithm: str = constants.DEFAULT_HASH_ALGORITHM,
+        rebuild: bool = False,
+        fsync: bool = False,
+        jobs: int = 1,
+        executor: str = 'thread',
+        watch: bool = False,
+        debounce: float = 0.2,
+        stats: str | None = None,
+        profile: bool = False,
+        cache: str = 'json',
+        verbosity: str = 'normal',
+        output_format: str = 'text',
+        low_memory: bool = False,
+        close_tags: int | None = None,
+        search: bool = False,
+        page_size: int | None = None,
+        folder_index: bool = False,
+        git: bool = False,
+    ) -> None:
+        """Инициализировать экземпляр."""
+        self.verify = verify
+        self.algorithm = algorithm
+        self.rebuild = rebuild
+        self.fsync = fsync
+        self.jobs = jobs
+        self.executor = executor
+        self.watch = watch
+        self.debounce = debounce
+        self.stats = stats
+        self.profile = profile
+        self.cache = cache
+        self.verbosity = verbosity
+        self.output_format = output_format
+        self.low_memory = low_memory
+        self.close_tags = close_tags
+        self.search = search
+        self.page_size = page_size
+        self.folder_index = folder_index
+        self.git = git
 
 
 class Fingerprint(TypedDict):
     """Слепок файловой системы, позволяющий определять изменения файлов."""
 
-    md5: str
-    created: int
+    hash: str | None
+    inode: int
     modified: int
     size: int
 
 
+class CacheRecord(TypedDict):
+    """Запись кеша: слепок файла и извлечённые из него данные."""
+
+    fingerprint: Fingerprint
+    title: str
+    tags: list[str]
+
+
 class File:
     """Пакет с метаинформацией о файле."""
 
@@ -34,7 +95,11 @@ class File:
         self.root = root or path
         self.path = path
         self._content = content
+        self._hashes: dict[str, str] = {}
+        self._needs_rewrite: bool | None = None
         self.has_changes = False
+        self.saved = False
+        self.bytes_read = 0
 
     def __eq__(self, other: Any) -> bool:
         """Вернуть True при равенстве."""
@@ -50,13 +115,84 @@ class File:
         """Загрузить содержимое файла."""
         with open(self.path, mode='r', encoding='utf-8') as file:
             self._content = file.read()
+            self.bytes_read += os.fstat(file.fileno()).st_size
         return self.path
 
-    def save(self) -> Path:
-        """Сохранить данные об уже обработанных файлах."""
-        with open(self.path, mode='w', encoding='utf-8') as file:
-            file.write(self.content)
-        return self.path
+    def save(
+        self,
+        writer: disk.Writer,
+        algorithm: str | None = None,
+    ) -> bool:
+        """Сохранить содержимое файла, вернуть True если оно изменилось.
+
+        Если задан algorithm, контрольная сумма считается по записанным
+        байтам, и перечитывать файл ради слепка не придётся.
+        """
+        data = disk.encode(self.content)
+        changed = writer.write(self.path, data)
+        if changed:
+            # после записи слепок устарел
+            self.__dict__.pop('stat', None)
+            self._hashes.clear()
+            self._needs_rewrite = None
+
+            if algorithm is not None:
+                file_hash = utils.make_hash(algorithm)
+                file_hash.update(data)
+                self._hashes[algorithm] = str(file_hash.hexdigest())
+        return changed
+
+    def scan(self, algorithm: str, known_hash: str | None = None) -> None:
+        """Прочитать файл один раз: контрольная сумма, заголовок и теги.
+
+        Поиск идёт прямо по байтам, большие файлы отображаются в память
+        через mmap. Декодируются только найденные заголовок и теги,
+        весь текст - только если в нём есть теги для замены на ссылки.
+        Если контрольная сумма совпала с known_hash, содержимое
+        не менялось и разбирать его не нужно.
+        """
+        with open(self.path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size >= constants.MMAP_THRESHOLD:
+                buffer: Any = mmap.mmap(
+                    file.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ,
+                )
+            else:
+                buffer = file.read()
+
+        try:
+            self.bytes_read += len(buffer)
+            file_hash = utils.make_hash(algorithm)
+            file_hash.update(buffer)
+            self._hashes[algorithm] = str(file_hash.hexdigest())
+
+            if self._hashes[algorithm] == known_hash:
+                return
+
+            result = scanner.scan(buffer, scanner.BYTES)
+            self.__dict__['title'] = result.title or constants.UNKNOWN
+            self.__dict__['tags'] = sorted(name for _, _, name in result.tags)
+            self._needs_rewrite = bool(result.bare)
+
+            if self._needs_rewrite and self._content is None:
+                self._content = utils.decode_text(buffer)
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+
+    @property
+    def needs_rewrite(self) -> bool:
+        """Вернуть True если в файле есть теги, не оформленные ссылками."""
+        if self._needs_rewrite is None:
+            self._needs_rewrite = bool(self.parsed.bare)
+        return self._needs_rewrite
+
+    def unload(self) -> None:
+        """Освободить память от содержимого файла."""
+        self._content = None
+        self.__dict__.pop('parsed', None)
 
     @property
     def content(self) -> str:
@@ -69,6 +205,9 @@ class File:
     def content(self, new_content: str) -> None:
         """Установить новое содержимое файла."""
         self._content = new_content
+        # заголовок и теги разбираются заново из нового текста
+        for name in ('parsed', 'title', 'tags'):
+            self.__dict__.pop(name, None)
 
     @cached_property
     def relative_path(self) -> Path:
@@ -81,34 +220,92 @@ class File:
         return list(self.relative_path.parts) + [self.title]
 
     @cached_property
-    def fingerprint(self) -> Fingerprint:
-        """Вернуть слепок файла."""
-        stat = os.stat(self.path)
+    def stat(self) -> os.stat_result:
+        """Вернуть данные файловой системы о файле."""
+        return os.stat(self.path)
+
+    def get_hash(self, algorithm: str) -> str:
+        """Вернуть контрольную сумму файла."""
+        if algorithm not in self._hashes:
+            file_hash = utils.make_hash(algorithm)
+            with open(self.path, 'rb') as f:
+                while chunk := f.read(8192):
+                    file_hash.update(chunk)
+                    self.bytes_read += len(chunk)
+            self._hashes[algorithm] = str(file_hash.hexdigest())
+        return self._hashes[algorithm]
 
-        with open(self.path, 'rb') as f:
-            file_hash = hashlib.md5()
-            while chunk := f.read(8192):
-                file_hash.update(chunk)
-
-        return Fingerprint(
-            md5=str(file_hash.hexdigest()),
-            created=int(stat.st_ctime),
-            modified=int(stat.st_mtime),
-            size=stat.st_size,
-        )
+    @cached_property
+    def parsed(self) -> scanner.Scan:
+        """Вернуть заголовок и теги файла, найденные за один проход."""
+        return scanner.scan(self.content)
 
     @cached_property
     def title(self) -> str:
         """Вернуть заголовок файла."""
-        match = constants.TITLE_PATTERN.search(self.content)
-        if match is None:
-            return constants.UNKNOWN
-        return match.groups()[0]
+        return self.parsed.title or constants.UNKNOWN
 
     @cached_property
     def tags(self) -> list[str]:
         """Вернуть все теги в файле."""
-        return sorted(constants.BASIC_TAG_PATTERN.findall(self.content))
+        return sorted(name for _, _, name in self.parsed.tags)
+
+
+class Note:
+    """Компактная запись о заметке, оставшаяся после её обработки.
+
+    Хранит только то, что нужно для документов тегов и README.
+    Содержимое файла в ней не удерживается, а одинаковые теги разных
+    заметок ссылаются на одну и ту же строку.
+    """
+
+    __slots__ = ('root', 'relative_path', 'title', 'tags', 'saved')
+
+    def __init__(
+        self,
+        root: Path,
+        relative_path: Path,
+        title: str,
+        tags: Iterable[str],
+        saved: bool = False,
+    ) -> None:
+        """Инициализировать экземпляр."""
+        self.root = root
+        self.relative_path = relative_path
+        self.title = title
+        self.tags = tuple(sys.intern(tag) for tag in tags)
+        self.saved = saved
+
+    @classmethod
+    def from_file(cls, file: File) -> 'Note':
+        """Создать запись по обработанному файлу."""
+        return cls(
+            root=file.root,
+            relative_path=file.relative_path,
+            title=file.title,
+            tags=file.tags,
+            saved=file.saved,
+        )
+
+    def __eq__(self, other: Any) -> bool:
+        """Вернуть True при равенстве."""
+        if not isinstance(other, Note):
+            return NotImplemented
+        return self.relative_path == other.relative_path
+
+    def __hash__(self) -> int:
+        """Вернуть хэш пути."""
+        return hash(self.relative_path)
+
+    @property
+    def path(self) -> Path:
+        """Вернуть полный путь до файла."""
+        return self.root / self.relative_path
+
+    @property
+    def sort_key(self) -> list[str]:
+        """Специальный параметр для сортировки."""
+        return list(self.relative_path.parts) + [self.title]
 
 
 class Cache:
@@ -116,38 +313,617 @@ class Cache:
 
     Содержит данные об уже обработанных файлах.
     Позволяет игнорировать их если они не изменялись.
+
+    Изменения ищутся в два этапа: сначала сравниваются размер, время
+    изменения и inode, и только если они не совпали, считается
+    контрольная сумма. В режиме verify сумма считается всегда.
+
+    Ключами служат пути относительно корневого каталога, поэтому перенос
+    всего каталога кеш не сбрасывает. Перенесённую внутри каталога
+    заметку можно найти среди записей по контрольной сумме.
     """
 
-    def __init__(self, path: Path, contents: dict[str, Any]) -> None:
+    def __init__(
+        self,
+        path: Path,
+        contents: dict[str, Any],
+        algorithm: str = constants.DEFAULT_HASH_ALGORITHM,
+        verify: bool = False,
+    ) -> None:
         """Инициализировать экземпляр."""
         self.path = path
         self.contents = contents
+        self.algorithm = algorithm
+        self.verify = verify
+        self.tag_digests: dict[str, str] = {}
+        # состояние репозитория git на момент сохранения кеша
+        self.git_state: dict[str, Any] = {}
+        # каталоги, в которые записаны оглавления, относительно корня
+        self.folder_indexes: list[str] = []
+        self._by_size: dict[int, list[str]] | None = None
+
+    @property
+    def full_path(self) -> Path:
+        """Вернуть путь к файлу кеша."""
+        return self.path / constants.CACHE_FILENAME
 
     def load(self) -> Path:
         """Загрузить кеш из файла."""
-        full_path = self.path / constants.CACHE_FILENAME
+        full_path = self.full_path
 
         try:
             with open(full_path, mode='r', encoding='utf-8') as file:
-                self.contents = json.load(file)
+                data = json.load(file)
         except (FileNotFoundError, json.decoder.JSONDecodeError):
+            data = {}
+
+        self._by_size = None
+
+        if data.get('version') == 2:
+            # в прошлой версии ключами были абсолютные пути
+            data['files'] = self._relative_keys(data.get('files', {}))
+            data['version'] = constants.CACHE_VERSION
+
+        if data.get('version') != constants.CACHE_VERSION:
+            # старый формат, проще всё пересчитать
             self.contents = {}
+            self.tag_digests = {}
+            self.git_state = {}
+            self.folder_indexes = []
+            return full_path
 
-        return full_path
+        self.tag_digests = data.get('tags', {})
+        self.git_state = data.get('git', {})
+        self.folder_indexes = data.get('folder_indexes', [])
 
-    def save(self) -> Path:
-        """Сохранить данные об уже обработанных файлах."""
-        full_path = self.path / constants.CACHE_FILENAME
+        if data.get('algorithm') != self.algorithm:
+            # суммы посчитаны другим алгоритмом, но данные stat ещё годятся
+            self.contents = data.get('files', {})
+            for record in self.contents.values():
+                record['fingerprint']['hash'] = None
 
-        with open(full_path, mode='w', encoding='utf-8') as file:
-            json.dump(self.contents, file, ensure_ascii=False, indent=4)
+        else:
+            self.contents = data.get('files', {})
 
         return full_path
 
+    def _relative_keys(self, files: dict[str, Any]) -> dict[str, Any]:
+        """Заменить абсолютные пути в ключах на относительные.
+
+        Записи о файлах вне корневого каталога отбрасываются.
+        """
+        root = self.path.absolute()
+        result = {}
+
+        for key, record in files.items():
+            try:
+                relative = Path(key).relative_to(root).as_posix()
+            except ValueError:
+                continue
+            result[relative] = record
+
+        return result
+
+    def save(self, writer: disk.Writer) -> bool:
+        """Сохранить данные о файлах, вернуть True если они изменились."""
+        data = {
+            'version': constants.CACHE_VERSION,
+            'algorithm': self.algorithm,
+            'files': self.contents,
+            'tags': self.tag_digests,
+        }
+        if self.git_state:
+            data['git'] = self.git_state
+        if self.folder_indexes:
+            data['folder_indexes'] = self.folder_indexes
+        return writer.write(
+            self.full_path,
+            json.dumps(data, ensure_ascii=False, indent=4),
+        )
+
+    @staticmethod
+    def get_key(file: File | Note) -> str:
+        """Вернуть ключ, под которым файл хранится в кеше."""
+        return file.relative_path.as_posix()
+
+    def get_record(self, file: File) -> CacheRecord | None:
+        """Вернуть запись кеша о файле."""
+        return self.contents.get(self.get_key(file))
+
+    def get_fingerprints(self) -> dict[str, Fingerprint]:
+        """Вернуть слепки всех файлов сразу, без заголовков и тегов."""
+        return {
+            key: record['fingerprint']
+            for key, record in self.contents.items()
+        }
+
+    def get_candidates(self, file: File) -> list[tuple[str, CacheRecord]]:
+        """Вернуть записи о файлах того же размера по другим путям.
+
+        Если файл перенесён, одна из них описывает его прежнее место,
+        что выяснится по контрольной сумме. Размер лишь отсекает
+        записи, которые заведомо не подходят, не читая файл.
+        """
+        if self._by_size is None:
+            self._by_size = {}
+            for key, record in self.contents.items():
+                fingerprint = record['fingerprint']
+                if fingerprint['hash'] is not None:
+                    self._by_size.setdefault(
+                        fingerprint['size'], []
+                    ).append(key)
+
+        own_key = self.get_key(file)
+        size = file.stat.st_size
+        candidates = []
+
+        for key in self._by_size.get(size, []):
+            record = self.contents.get(key)
+            if (
+                key != own_key
+                and record is not None
+                and record['fingerprint']['size'] == size
+                and record['fingerprint']['hash'] is not None
+            ):
+                candidates.append((key, record))
+
+        return candidates
+
     def has_no_changes(self, file: File) -> bool:
         """Вернуть True если файл не менялся с прошлого запуска."""
-        return self.contents.get(str(file.path.absolute())) == file.fingerprint
+        record = self.get_record(file)
+        if record is None:
+            return False
+
+        fingerprint = record['fingerprint']
+        if not self.verify and self.same_stat(fingerprint, file):
+            return True
+
+        if fingerprint['size'] != file.stat.st_size:
+            return False
+
+        return fingerprint['hash'] == file.get_hash(self.algorithm)
+
+    @staticmethod
+    def same_stat(fingerprint: Fingerprint, file: File) -> bool:
+        """Вернуть True если данные файловой системы не изменились."""
+        stat = file.stat
+        return (
+            fingerprint['size'] == stat.st_size
+            and fingerprint['modified'] == stat.st_mtime_ns
+            and fingerprint['inode'] == stat.st_ino
+        )
 
-    def store_file(self, file: File) -> None:
+    def restore_file(self, file: File) -> bool:
+        """Подставить в файл заголовок и теги из кеша.
+
+        Возвращает False если файл менялся и его надо читать заново.
+        """
+        if not self.has_no_changes(file):
+            return False
+
+        record = cast(CacheRecord, self.get_record(file))
+        file.title = record['title']
+        file.tags = record['tags']
+        return True
+
+    def make_fingerprint(self, file: File) -> Fingerprint:
+        """Вернуть слепок файла, по возможности не читая его.
+
+        Сумма из кеша годится, только если свежая ещё не посчитана
+        и файл не менялся: в режиме verify содержимое может смениться
+        при тех же данных stat.
+        """
+        record = self.get_record(file)
+
+        if (
+            record is not None
+            and record['fingerprint']['hash'] is not None
+            and not file.has_changes
+            and self.algorithm not in file._hashes
+            and self.same_stat(record['fingerprint'], file)
+        ):
+            file_hash = record['fingerprint']['hash']
+        else:
+            file_hash = file.get_hash(self.algorithm)
+
+        return Fingerprint(
+            hash=file_hash,
+            inode=file.stat.st_ino,
+            modified=file.stat.st_mtime_ns,
+            size=file.stat.st_size,
+        )
+
+    def forget_missing(self, notes: list[Note]) -> None:
+        """Удалить из кеша записи о файлах, которых больше нет."""
+        present = {self.get_key(note) for note in notes}
+        for key in self.contents.keys() - present:
+            del self.contents[key]
+        self._by_size = None
+
+    def store_file(self, note: Note, fingerprint: Fingerprint) -> None:
         """Обновить данные о файле в кеше."""
-        self.contents[str(file.path.absolute())] = file.fingerprint
+        self.contents[self.get_key(note)] = CacheRecord(
+            fingerprint=fingerprint,
+            title=note.title,
+            tags=list(note.tags),
+        )
+
+    def release(self, note: Note) -> None:
+        """Разрешить не держать запись о файле в памяти.
+
+        Кеш в формате JSON сохраняется целиком, поэтому ничего не делает.
+        """
+
+    def close(self) -> None:
+        """Освободить ресурсы.
+
+        Кеш в формате JSON ничего не держит открытым, поэтому ничего
+        не делает.
+        """
+
+
+class SqliteCache(Cache):
+    """Кеш в базе SQLite.
+
+    Записи читаются по мере надобности, а при сохранении в базу
+    попадают только изменившиеся строки, поэтому время работы зависит
+    от количества изменений, а не от размера каталога. Если рядом
+    лежит кеш в формате JSON, его содержимое переносится в базу.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        contents: dict[str, Any],
+        algorithm: str = constants.DEFAULT_HASH_ALGORITHM,
+        verify: bool = False,
+    ) -> None:
+        """Инициализировать экземпляр."""
+        super().__init__(path, contents, algorithm, verify)
+        self._connection: sqlite3.Connection | None = None
+        self._missing: set[str] = set()
+        self._changed: set[str] = set()
+        self._deleted: set[str] = set()
+        self._stored_tag_digests: dict[str, str] = {}
+        self._stored_git_state: dict[str, Any] = {}
+        self._stored_folder_indexes: list[str] = []
+        # база создана при загрузке и ещё не учтена в статистике
+        self._created = False
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Вернуть соединение с базой."""
+        if self._connection is None:
+            msg = 'Кеш не загружен'
+            raise RuntimeError(msg)
+        return self._connection
+
+    @property
+    def full_path(self) -> Path:
+        """Вернуть путь к базе."""
+        return self.path / constants.SQLITE_CACHE_FILENAME
+
+    def load(self) -> Path:
+        """Открыть базу, при необходимости создать или обновить её."""
+        full_path = self.full_path
+        self._connection = sqlite3.connect(full_path)
+        self.contents = {}
+        self._missing.clear()
+        self._changed.clear()
+        self._deleted.clear()
+
+        meta = self._read_meta()
+        self.git_state = json.loads(meta.get('git', '{}'))
+        self._stored_git_state = dict(self.git_state)
+        self.folder_indexes = json.loads(meta.get('folder_indexes', '[]'))
+        self._stored_folder_indexes = list(self.folder_indexes)
+
+        if meta.get('version') != str(constants.SQLITE_CACHE_VERSION):
+            self.git_state = {}
+            self._stored_folder_indexes = []
+            self._create_schema()
+            self._import_json()
+            self._created = True
+        elif meta.get('algorithm') != self.algorithm:
+            # суммы посчитаны другим алгоритмом, но данные stat ещё годятся
+            with self.connection:
+                self.connection.execute('UPDATE files SET hash = NULL')
+                self._write_meta()
+
+        with self.connection:
+            # базы прошлых запусков могли быть созданы без этого индекса
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS files_by_content '
+                'ON files (size, hash)'
+            )
+
+        self.tag_digests = dict(
+            self.connection.execute('SELECT tag, digest FROM tags')
+        )
+        self._stored_tag_digests = dict(self.tag_digests)
+        return full_path
+
+    def _read_meta(self) -> dict[str, str]:
+        """Прочитать служебные данные, если они есть."""
+        try:
+            return dict(
+                self.connection.execute('SELECT key, value FROM meta')
+            )
+        except sqlite3.DatabaseError:
+            return {}
+
+    def _write_meta(self) -> None:
+        """Записать версию схемы и алгоритм контрольных сумм."""
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            [
+                ('version', str(constants.SQLITE_CACHE_VERSION)),
+                ('algorithm', self.algorithm),
+            ],
+        )
+
+    def _create_schema(self) -> None:
+        """Создать таблицы с нуля."""
+        with self.connection:
+            self.connection.executescript(
+                """
+                DROP TABLE IF EXISTS meta;
+                DROP TABLE IF EXISTS files;
+                DROP TABLE IF EXISTS tags;
+                CREATE TABLE meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE files (
+                    path TEXT PRIMARY KEY,
+                    hash TEXT,
+                    inode INTEGER NOT NULL,
+                    modified INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    tags TEXT NOT NULL
+                );
+                CREATE TABLE tags (
+                    tag TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL
+                );
+                """
+            )
+            self._write_meta()
+
+    def _import_json(self) -> None:
+        """Перенести в базу данные из кеша в формате JSON."""
+        old_cache = Cache(self.path, {}, self.algorithm)
+        json_path = old_cache.load()
+        self.folder_indexes = old_cache.folder_indexes
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    self._as_row(key, record)
+                    for key, record in old_cache.contents.items()
+                ),
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO tags VALUES (?, ?)',
+                old_cache.tag_digests.items(),
+            )
+
+        json_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _as_row(key: str, record: CacheRecord) -> tuple[Any, ...]:
+        """Превратить запись кеша в строку таблицы."""
+        fingerprint = record['fingerprint']
+        return (
+            key,
+            fingerprint['hash'],
+            fingerprint['inode'],
+            fingerprint['modified'],
+            fingerprint['size'],
+            record['title'],
+            json.dumps(record['tags'], ensure_ascii=False),
+        )
+
+    def save(self, writer: disk.Writer) -> bool:
+        """Записать в базу изменившиеся строки, вернуть True если они были.
+
+        В базу пишет сама sqlite3, поэтому в статистику writer она
+        попадает отдельно: с объёмом записанных строк или как файл
+        без изменений.
+        """
+        deleted_files = [(key,) for key in sorted(self._deleted)]
+        changed_files = [
+            self._as_row(key, self.contents[key])
+            for key in sorted(self._changed)
+        ]
+        changed_tags = [
+            (tag, digest)
+            for tag, digest in self.tag_digests.items()
+            if self._stored_tag_digests.get(tag) != digest
+        ]
+        deleted_tags = [
+            (tag,)
+            for tag in self._stored_tag_digests.keys()
+            - self.tag_digests.keys()
+        ]
+        changed_meta = []
+        if self.git_state != self._stored_git_state:
+            changed_meta.append(
+                ('git', json.dumps(self.git_state, ensure_ascii=False))
+            )
+        if self.folder_indexes != self._stored_folder_indexes:
+            changed_meta.append(
+                (
+                    'folder_indexes',
+                    json.dumps(self.folder_indexes, ensure_ascii=False),
+                )
+            )
+
+        with self.connection:
+            self.connection.executemany(
+                'DELETE FROM files WHERE path = ?',
+                deleted_files,
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                changed_files,
+            )
+            self.connection.executemany(
+                'DELETE FROM tags WHERE tag = ?',
+                deleted_tags,
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO tags VALUES (?, ?)',
+                changed_tags,
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                changed_meta,
+            )
+
+        # примерный объём записанных данных: сами значения строк
+        size = sum(
+            len(str(value).encode('utf-8'))
+            for rows in (
+                deleted_files,
+                changed_files,
+                changed_tags,
+                deleted_tags,
+                changed_meta,
+            )
+            for row in rows
+            for value in row
+            if value is not None
+        )
+        if self._created:
+            size += self.full_path.stat().st_size
+
+        changed = writer.record(self.full_path, size)
+        self._changed.clear()
+        self._deleted.clear()
+        self._stored_tag_digests = dict(self.tag_digests)
+        self._stored_git_state = dict(self.git_state)
+        self._stored_folder_indexes = list(self.folder_indexes)
+        self._created = False
+        return changed
+
+    @staticmethod
+    def _as_record(row: tuple[Any, ...]) -> CacheRecord:
+        """Превратить строку таблицы в запись кеша."""
+        file_hash, inode, modified, size, title, tags = row
+        return CacheRecord(
+            fingerprint=Fingerprint(
+                hash=file_hash,
+                inode=inode,
+                modified=modified,
+                size=size,
+            ),
+            title=title,
+            tags=json.loads(tags),
+        )
+
+    def get_record(self, file: File) -> CacheRecord | None:
+        """Вернуть запись кеша о файле, при необходимости прочитав её."""
+        key = self.get_key(file)
+
+        if key in self.contents:
+            return cast(CacheRecord, self.contents[key])
+
+        if key in self._missing:
+            return None
+
+        row = self.connection.execute(
+            'SELECT hash, inode, modified, size, title, tags '
+            'FROM files WHERE path = ?',
+            (key,),
+        ).fetchone()
+
+        if row is None:
+            self._missing.add(key)
+            return None
+
+        record = self._as_record(row)
+        self.contents[key] = record
+        return record
+
+    def get_fingerprints(self) -> dict[str, Fingerprint]:
+        """Вернуть слепки всех файлов одним запросом.
+
+        Записи, выгруженные из памяти в режиме low_memory, при этом
+        в неё не возвращаются.
+        """
+        fingerprints = {
+            key: Fingerprint(
+                hash=file_hash,
+                inode=inode,
+                modified=modified,
+                size=size,
+            )
+            for key, file_hash, inode, modified, size in (
+                self.connection.execute(
+                    'SELECT path, hash, inode, modified, size FROM files'
+                )
+            )
+            if key not in self._deleted
+        }
+        # ещё не сохранённые записи есть только в памяти
+        for key in self._changed:
+            fingerprints[key] = self.contents[key]['fingerprint']
+        return fingerprints
+
+    def get_candidates(self, file: File) -> list[tuple[str, CacheRecord]]:
+        """Вернуть записи о файлах того же размера по другим путям."""
+        rows = self.connection.execute(
+            'SELECT path, hash, inode, modified, size, title, tags '
+            'FROM files WHERE size = ? AND hash IS NOT NULL AND path != ?',
+            (file.stat.st_size, self.get_key(file)),
+        )
+        return [(key, self._as_record(row)) for key, *row in rows]
+
+    def forget_missing(self, notes: list[Note]) -> None:
+        """Удалить из кеша записи о файлах, которых больше нет."""
+        present = {self.get_key(note) for note in notes}
+        stored = {
+            key for key, in self.connection.execute('SELECT path FROM files')
+        }
+
+        for key in (stored | self.contents.keys()) - present:
+            self.contents.pop(key, None)
+            self._changed.discard(key)
+            self._deleted.add(key)
+
+    def store_file(self, note: Note, fingerprint: Fingerprint) -> None:
+        """Обновить данные о файле, запомнив его для сохранения."""
+        key = self.get_key(note)
+        old_record = self.contents.get(key)
+        super().store_file(note, fingerprint)
+
+        if self.contents[key] != old_record:
+            self._changed.add(key)
+            self._missing.discard(key)
+
+    def release(self, note: Note) -> None:
+        """Выгрузить из памяти запись, если её не нужно сохранять."""
+        key = self.get_key(note)
+        if key not in self._changed:
+            self.contents.pop(key, None)
+
+    def close(self) -> None:
+        """Закрыть соединение с базой."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def make_cache(path: Path, settings: Settings) -> Cache:
+    """Создать кеш выбранного вида."""
+    cache_type = SqliteCache if settings.cache == 'sqlite' else Cache
+    return cache_type(
+        path=path,
+        contents={},
+        algorithm=settings.algorithm,
+        verify=settings.verify,
+    )
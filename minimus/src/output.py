@@ -1,34 +1,272 @@
 """Модуль для вывода сообщений на экран.
 """
+import cProfile
+import io
+import json
 from pathlib import Path
+import pstats
+import sys
+import time
+from typing import Any
+from typing import TextIO
+from typing import TypedDict
 
 from minimus.src import constants
+from minimus.src import metrics
 
+LEVELS = {
+    'quiet': 0,
+    'normal': 1,
+    'verbose': 2,
+}
 
-def greet() -> None:
-    """Распечатать приветствие."""
-    print_line()
-    print(constants.LOGO)
-    print_line()
+# Не выводить строку прогресса чаще, чем раз в столько секунд
+PROGRESS_INTERVAL = 0.1
 
+# Сбрасывать накопленный текст в поток, когда его станет больше
+BUFFER_SIZE = 64 * 1024
 
-def print_line() -> None:
-    """Вывести на экран горизонтальную линию."""
-    print(constants.LINE)
 
+class VaultResult(TypedDict):
+    """Итог обработки одного каталога."""
+    path: Path
+    seconds: float
+    unchanged: bool
+    metrics: metrics.Metrics
 
-def print_path(path: Path) -> None:
-    """Вывести на экран стартовые настройки скрипта."""
-    print(f'Исходный каталог: {path.absolute()}')
 
+class Reporter:
+    """Вывод сообщений о ходе обработки.
 
-def header(text: str) -> None:
-    """Вывести новый блок текста."""
-    print()
-    print(text)
+    Сообщения копятся в буфере и уходят в поток крупными порциями.
+    Уровень quiet не выводит ничего, кроме явно запрошенных замеров,
+    verbose добавляет сообщения о каждой нетронутой заметке.
+    В режиме structured каждое событие выводится строкой JSON.
+    """
 
+    def __init__(
+        self,
+        level: str = 'normal',
+        structured: bool = False,
+        stream: TextIO | None = None,
+    ) -> None:
+        """Инициализировать экземпляр."""
+        self.level = LEVELS[level]
+        self.structured = structured
+        self.stream = stream or sys.stdout
+        self._buffer: list[str] = []
+        self._buffered = 0
+        self._progress_shown = False
+        self._last_progress = 0.0
+        self._interactive = (
+            not structured
+            and self.level > LEVELS['quiet']
+            and self.stream.isatty()
+        )
 
-def complete(seconds: float) -> None:
-    """Вывести на экран сообщение об окончании работы программы."""
-    print_line()
-    print(f'Обработка заняла {seconds:0.2f} сек.')
+    def _write(self, text: str) -> None:
+        """Добавить строку в буфер."""
+        if self._progress_shown:
+            self._buffer.append('\r\033[K')
+            self._progress_shown = False
+
+        self._buffer.append(text + '\n')
+        self._buffered += len(text) + 1
+
+        if self._buffered >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Отправить накопленный текст в поток."""
+        if self._buffer:
+            self.stream.write(''.join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+        self.stream.flush()
+
+    def event(
+        self,
+        name: str,
+        text: str | None = None,
+        level: str = 'normal',
+        **data: Any,
+    ) -> None:
+        """Сообщить о событии."""
+        if LEVELS[level] > self.level:
+            return
+
+        if self.structured:
+            record = {'event': name, **data}
+            self._write(json.dumps(record, ensure_ascii=False, default=str))
+        elif text is not None:
+            self._write(text)
+
+    def text(self, text: str, level: str = 'normal') -> None:
+        """Вывести текст, который не нужен в структурированном режиме."""
+        if not self.structured and LEVELS[level] <= self.level:
+            self._write(text)
+
+    def greet(self) -> None:
+        """Распечатать приветствие."""
+        self.text(constants.LINE)
+        self.text(constants.LOGO)
+        self.text(constants.LINE)
+
+    def print_path(self, path: Path) -> None:
+        """Вывести на экран стартовые настройки скрипта."""
+        self.event(
+            'start',
+            f'Исходный каталог: {path.absolute()}',
+            path=path.absolute(),
+        )
+
+    def header(self, text: str) -> None:
+        """Вывести новый блок текста."""
+        self.text(f'\n{text}')
+
+    def note(self, relative_path: Path, saved: bool) -> None:
+        """Сообщить о результате обработки заметки."""
+        if saved:
+            self.event(
+                'note_saved',
+                f'\t+++ Сохранён: {relative_path}',
+                path=relative_path,
+            )
+        else:
+            self.event(
+                'note_unchanged',
+                f'\tТеги не менялись: {relative_path}',
+                level='verbose',
+                path=relative_path,
+            )
+
+    def progress(self, done: int) -> None:
+        """Обновить строку прогресса, не чаще заданного интервала."""
+        if not self._interactive:
+            return
+
+        now = time.monotonic()
+        if now - self._last_progress < PROGRESS_INTERVAL:
+            return
+
+        self._last_progress = now
+        self.flush()
+        self.stream.write(f'\r\033[K\tОбработано заметок: {done}')
+        self.stream.flush()
+        self._progress_shown = True
+
+    def complete(self, seconds: float) -> None:
+        """Вывести на экран сообщение об окончании работы программы."""
+        self.text(constants.LINE)
+        self.event(
+            'complete',
+            f'Обработка заняла {seconds:0.2f} сек.',
+            seconds=round(seconds, 6),
+        )
+        self.flush()
+
+    def print_vaults(self, vaults: list[VaultResult], seconds: float) -> None:
+        """Вывести время обработки каждого каталога и общее."""
+        self.header('Итоги по каталогам')
+
+        for vault in vaults:
+            notes = vault['metrics'].counters.get('notes', 0)
+            saved = vault['metrics'].counters.get('files_written', 0)
+
+            if vault['unchanged']:
+                details = 'без изменений'
+            else:
+                details = f'заметок: {notes}, записано файлов: {saved}'
+
+            self.event(
+                'vault',
+                f'\t{vault["path"].absolute()}: '
+                f'{vault["seconds"]:0.2f} сек., {details}',
+                path=vault['path'].absolute(),
+                seconds=round(vault['seconds'], 6),
+                unchanged=vault['unchanged'],
+                notes=notes,
+                files_written=saved,
+            )
+
+        self.text(constants.LINE)
+        self.event(
+            'total',
+            f'Каталогов: {len(vaults)}, обработка заняла {seconds:0.2f} сек.',
+            vaults=len(vaults),
+            seconds=round(seconds, 6),
+        )
+        self.flush()
+
+    def print_metrics(self, run_metrics: metrics.Metrics, kind: str) -> None:
+        """Вывести на экран замеры по этапам обработки."""
+        if self.structured:
+            self.event('metrics', level='quiet', **run_metrics.as_dict())
+            self.flush()
+            return
+
+        if kind == 'json':
+            self._write(json.dumps(run_metrics.as_dict(), ensure_ascii=False))
+            self.flush()
+            return
+
+        self._write('\nЗамеры по этапам')
+        for name, seconds in run_metrics.phases.items():
+            self._write(f'\t{name}: {seconds:0.4f} сек.')
+
+        self._write('\nСчётчики')
+        for name, value in run_metrics.counters.items():
+            self._write(f'\t{name}: {value}')
+
+        self.flush()
+
+    def print_profile(
+        self,
+        profiler: cProfile.Profile,
+        limit: int = 30,
+    ) -> None:
+        """Вывести на экран самые затратные функции."""
+        stream = io.StringIO()
+        statistics = pstats.Stats(profiler, stream=stream)
+        statistics.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        self._write('\nПрофиль')
+        self._write(stream.getvalue())
+        self.flush()
+
+
+class Recorder(Reporter):
+    """Запись событий в память вместо вывода на экран.
+
+    Нужна при встраивании в другую программу: все события, в том числе
+    подробные, доступны как словари, а в поток ничего не пишется.
+    """
+
+    def __init__(self) -> None:
+        """Инициализировать экземпляр."""
+        super().__init__(
+            level='verbose',
+            structured=True,
+            stream=io.StringIO(),
+        )
+        self.events: list[dict[str, Any]] = []
+
+    def event(
+        self,
+        name: str,
+        text: str | None = None,
+        level: str = 'normal',
+        **data: Any,
+    ) -> None:
+        """Запомнить событие."""
+        self.events.append({'event': name, **data})
+
+    def text(self, text: str, level: str = 'normal') -> None:
+        """Ничего не делать: текст без данных не нужен."""
+
+    def flush(self) -> None:
+        """Ничего не делать: поток не используется."""
+
+
+def make_reporter(verbosity: str, output_format: str) -> Reporter:
+    """Создать вывод сообщений с заданными настройками."""
+    return Reporter(level=verbosity, structured=output_format == 'json')
@@ -0,0 +1,298 @@
+"""Модуль обработки отдельных заметок.
+
+Обработка каждой заметки не зависит от остальных, поэтому её можно
+выполнять в пуле потоков или процессов. Функции отсюда получают на вход
+только то, что можно передать в другой процесс.
+"""
+from collections import deque
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from itertools import islice
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import TypeVar
+
+from minimus.src import disk
+from minimus.src import markup
+from minimus.src import metrics as metrics_module
+from minimus.src import objects
+from minimus.src import vcs
+
+T = TypeVar('T')
+
+# Обработанная заметка, её слепок и статистика исполнителя
+HandleResult = tuple[
+    objects.Note,
+    objects.Fingerprint,
+    disk.Writer,
+    metrics_module.Metrics,
+]
+
+# Записи кеша, среди которых может найтись прежнее место заметки
+Candidates = list[tuple[str, objects.CacheRecord]]
+
+# Сколько заметок за раз отдавать в другой процесс
+PROCESS_CHUNK_SIZE = 32
+
+# Сколько задач на одного исполнителя держать в очереди
+QUEUE_PER_WORKER = 8
+
+
+def make_executor(settings: objects.Settings) -> Executor | None:
+    """Создать пул исполнителей, если запрошено больше одного."""
+    if settings.jobs <= 1:
+        return None
+
+    if settings.executor == 'process':
+        return ProcessPoolExecutor(max_workers=settings.jobs)
+
+    return ThreadPoolExecutor(max_workers=settings.jobs)
+
+
+def handle_file(
+    file: objects.File,
+    record: objects.CacheRecord | None,
+    settings: objects.Settings,
+    trusted: bool = False,
+    candidates: Candidates | None = None,
+) -> HandleResult:
+    """Проверить, разобрать и при необходимости переписать заметку.
+
+    Заметка с флагом trusted заведомо не менялась, её запись берётся
+    из кеша как есть, без обращения к файлу. Если записи о заметке нет,
+    но её контрольная сумма совпала с одной из candidates, заметка
+    перенесена: заголовок и теги берутся из той записи, а в ссылках
+    на теги пересчитывается только глубина.
+    """
+    writer = disk.Writer(fsync=settings.fsync)
+    file_metrics = metrics_module.Metrics()
+
+    if (
+        trusted
+        and record is not None
+        and record['fingerprint']['hash'] is not None
+    ):
+        file_metrics.count('cache_hits')
+        file_metrics.count('notes_trusted')
+        note = objects.Note(
+            root=file.root,
+            relative_path=file.relative_path,
+            title=record['title'],
+            tags=record['tags'],
+        )
+        return note, record['fingerprint'], writer, file_metrics
+
+    moved_from = None
+    if record is None and candidates:
+        with file_metrics.phase('hashing'):
+            file_hash = file.get_hash(settings.algorithm)
+        for key, candidate in candidates:
+            if candidate['fingerprint']['hash'] == file_hash:
+                moved_from, record = key, candidate
+                break
+
+    contents = {} if record is None else {objects.Cache.get_key(file): record}
+    cache = objects.Cache(
+        path=file.root,
+        contents=contents,
+        algorithm=settings.algorithm,
+        verify=settings.verify,
+    )
+
+    if moved_from is None and (
+        record is None or not cache.same_stat(record['fingerprint'], file)
+    ):
+        # файл всё равно придётся читать ради контрольной суммы,
+        # заголовок и теги находятся за тот же проход
+        with file_metrics.phase('reading'):
+            file.scan(
+                settings.algorithm,
+                None if record is None else record['fingerprint']['hash'],
+            )
+
+    with file_metrics.phase('hashing'):
+        file.has_changes = not cache.restore_file(file)
+
+    if file.has_changes:
+        file_metrics.count('cache_misses')
+
+        with file_metrics.phase('parsing'):
+            _ = file.title, file.tags
+
+        if file.needs_rewrite:
+            with file_metrics.phase('rewrite'):
+                new_content = markup.replace_bare_tags(file)
+
+                if new_content != file.content:
+                    file.content = new_content
+                    file.saved = file.save(writer, settings.algorithm)
+    else:
+        file_metrics.count('cache_hits')
+
+    if moved_from is not None:
+        file_metrics.count('notes_moved')
+        old_hops = markup.get_hops(Path(moved_from))
+        new_hops = markup.get_hops(file.relative_path)
+
+        if file.tags and old_hops != new_hops:
+            with file_metrics.phase('rewrite'):
+                new_content = markup.move_tag_links(
+                    file.content,
+                    old_hops,
+                    new_hops,
+                )
+
+                if new_content != file.content:
+                    file.content = new_content
+                    file.saved = file.save(writer, settings.algorithm)
+
+    with file_metrics.phase('hashing'):
+        fingerprint = cache.make_fingerprint(file)
+
+    if file.bytes_read:
+        file_metrics.count('files_read')
+        file_metrics.count('bytes_read', file.bytes_read)
+
+    # заголовок и теги переписанной заметки берутся из текста в памяти
+    note = objects.Note.from_file(file)
+    file.unload()
+    return note, fingerprint, writer, file_metrics
+
+
+def handle_chunk(
+    tasks: list[
+        tuple[objects.File, objects.CacheRecord | None, bool, Candidates]
+    ],
+    settings: objects.Settings,
+) -> list[HandleResult]:
+    """Обработать пачку заметок за один вызов, для пула процессов."""
+    return [
+        handle_file(file, record, settings, trusted, candidates)
+        for file, record, trusted, candidates in tasks
+    ]
+
+
+def map_bounded(
+    executor: Executor,
+    function: Callable[..., T],
+    tasks: Iterable[tuple[Any, ...]],
+    window: int,
+) -> Iterator[T]:
+    """Выполнить функцию в пуле, сохраняя порядок результатов.
+
+    В отличие от Executor.map задачи отправляются в пул по мере
+    освобождения места в окне, поэтому в памяти одновременно находится
+    не больше window задач и результатов.
+    """
+    pending: deque[Future[T]] = deque()
+
+    for task in tasks:
+        pending.append(executor.submit(function, *task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def chunked(
+    items: Iterable[T],
+    size: int,
+) -> Iterator[list[T]]:
+    """Разбить поток элементов на списки заданного размера."""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def make_task(
+    file: objects.File,
+    cache: objects.Cache,
+    changes: vcs.GitChanges | None,
+) -> tuple[objects.File, objects.CacheRecord | None, bool, Candidates]:
+    """Собрать всё, что нужно исполнителю для обработки заметки."""
+    record = cache.get_record(file)
+
+    if record is not None:
+        trusted = changes is not None and changes.is_trusted(
+            file.relative_path.as_posix()
+        )
+        return file, record, trusted, []
+
+    return file, None, False, cache.get_candidates(file)
+
+
+def handle_files(
+    files: Iterable[objects.File],
+    cache: objects.Cache,
+    settings: objects.Settings,
+    writer: disk.Writer,
+    executor: Executor | None = None,
+    metrics: metrics_module.Metrics | None = None,
+    progress: Callable[[int], None] | None = None,
+    changes: vcs.GitChanges | None = None,
+) -> list[objects.Note]:
+    """Обработать все заметки и занести их в кеш.
+
+    Результаты собираются в исходном порядке, поэтому вывод не зависит
+    от количества исполнителей. От каждого файла остаётся только
+    компактная запись Note, содержимое в памяти не удерживается.
+    Если переданы изменения по данным git, заметки, которые git
+    считает нетронутыми, не проверяются. Для заметок без записи в кеше
+    подбираются записи, из которых они могли быть перенесены.
+    """
+    metrics = metrics or metrics_module.Metrics()
+    tasks = (
+        make_task(file, cache, changes)
+        for file in metrics.timed('walk', files)
+    )
+    window = settings.jobs * (1 if settings.low_memory else QUEUE_PER_WORKER)
+    results: Iterable[HandleResult]
+
+    if executor is None:
+        results = (
+            handle_file(file, record, settings, trusted, candidates)
+            for file, record, trusted, candidates in tasks
+        )
+    elif isinstance(executor, ProcessPoolExecutor):
+        chunks = chunked(tasks, PROCESS_CHUNK_SIZE)
+        results = chain.from_iterable(
+            map_bounded(
+                executor,
+                handle_chunk,
+                ((chunk, settings) for chunk in chunks),
+                window=window,
+            )
+        )
+    else:
+        results = map_bounded(
+            executor,
+            handle_file,
+            (
+                (file, record, settings, trusted, candidates)
+                for file, record, trusted, candidates in tasks
+            ),
+            window=window,
+        )
+
+    handled: list[objects.Note] = []
+    for note, fingerprint, file_writer, file_metrics in results:
+        writer.merge(file_writer)
+        metrics.merge(file_metrics)
+        note.root = cache.path
+        cache.store_file(note, fingerprint)
+        handled.append(note)
+
+        if settings.low_memory:
+            cache.release(note)
+
+        if progress is not None:
+            progress(len(handled))
+
+    return handled
@@ -0,0 +1,180 @@
+"""Модуль переименования и слияния тегов в обработанном каталоге.
+"""
+from pathlib import Path
+from typing import cast
+
+from minimus.src import constants
+from minimus.src import disk
+from minimus.src import index
+from minimus.src import markup
+from minimus.src import objects
+from minimus.src import output
+from minimus.src import runner
+from minimus.src import scanner
+from minimus.src import search
+from minimus.src import snapshot
+from minimus.src import storage
+from minimus.src import tags
+
+
+class RetagError(ValueError):
+    """Переименование невозможно выполнить."""
+
+
+def is_valid_tag(text: str) -> bool:
+    """Вернуть True, если текст можно записать тегом без искажений.
+
+    >>> is_valid_tag('серый цвет'), is_valid_tag(''), is_valid_tag('a }} b')
+    (True, False, False)
+    """
+    result = scanner.scan(f'{{{{ {text} }}}}')
+    return result.tags == [(0, len(text) + 6, text)]
+
+
+def rename_tags(
+    path: Path,
+    renames: dict[str, str],
+    reporter: output.Reporter,
+) -> int:
+    """Заменить теги в заметках и документах тегов, вернуть число заметок.
+
+    Затронутые заметки находятся по индексу тегов прошлого запуска,
+    остальные не открываются. Документы тегов пересчитываются
+    по индексу, и на диск попадают только изменившиеся: документы
+    самих тегов и их близких тегов. Все изменения записываются
+    одной транзакцией.
+    """
+    settings = snapshot.read_settings(path)
+    tag_index = index.TagIndex.load(path)
+
+    if settings is None or tag_index is None:
+        msg = (
+            f'Каталог {path.absolute()} ещё не обработан, '
+            f'сначала запустите minimus'
+        )
+        raise RetagError(msg)
+
+    missing = [old for old in renames if old not in tag_index.ids]
+    if missing:
+        msg = f'Теги не найдены: {", ".join(missing)}'
+        raise RetagError(msg)
+
+    for new in renames.values():
+        if not is_valid_tag(new):
+            msg = f'Недопустимое имя тега: {new!r}'
+            raise RetagError(msg)
+
+    names = [renames.get(name, name) for name in tag_index.tag_names]
+    notes: list[objects.Note | None] = [
+        objects.Note(
+            root=path,
+            relative_path=Path(relative_path),
+            title=title,
+            tags=[names[tag_id] for tag_id in tag_ids],
+        )
+        for relative_path, title, tag_ids in tag_index.notes
+    ]
+    affected = sorted(
+        {
+            note_id
+            for old in renames
+            for note_id in tag_index.postings[tag_index.ids[old]]
+        }
+    )
+
+    cache = objects.make_cache(path, settings)
+    cache.load()
+    saved_notes = 0
+
+    reporter.header('Сохранение заметок')
+    with disk.Transaction() as transaction:
+        for note_id in affected:
+            old_note = cast(objects.Note, notes[note_id])
+            note = rewrite_note(old_note, renames, cache, transaction)
+            notes[note_id] = note
+
+            if note is None:
+                reporter.event(
+                    'note_missing',
+                    f'\tЗаметки больше нет: {old_note.relative_path}',
+                    path=old_note.relative_path,
+                )
+            else:
+                reporter.note(note.relative_path, note.saved)
+                saved_notes += note.saved
+
+        present = [note for note in notes if note is not None]
+        tag_table = tags.make_tag_table(present)
+        saved_tags, removed_tags = runner.save_tag_pages(
+            path=path,
+            settings=settings,
+            cache=cache,
+            writer=transaction,
+            tag_table=tag_table,
+        )
+        index.TagIndex.from_table(tag_table, present).save(path, transaction)
+        cache.save(transaction)
+
+    transaction.flush()
+
+    if search.SearchIndex.exists(path):
+        search_index = search.SearchIndex(path)
+        search_index.update(present, cache)
+        search_index.close()
+
+    # для снимка нужно время изменения каталогов после записи
+    visited: dict[str, int] = {}
+    list(storage.iter_files(path, visited, with_stat=False))
+    snapshot.save(path, settings, cache, present, visited, disk.Writer())
+    cache.close()
+
+    reporter.event(
+        'retag',
+        f'\tСохранено заметок: {saved_notes} шт. из {len(affected)}\n'
+        f'\tСохранено тегов: {len(saved_tags)} шт. \n'
+        f'\tУдалено тегов: {len(removed_tags)} шт. ',
+        renames=renames,
+        saved=saved_notes,
+        total=len(affected),
+        tags_saved=saved_tags,
+        tags_removed=removed_tags,
+    )
+    return saved_notes
+
+
+def rewrite_note(
+    note: objects.Note,
+    renames: dict[str, str],
+    cache: objects.Cache,
+    writer: disk.Writer,
+) -> objects.Note | None:
+    """Переименовать теги в одной заметке, вернуть None если её нет.
+
+    Запись кеша обновляется, только если до переименования заметка
+    не менялась: иначе следующий запуск должен обработать её целиком.
+    """
+    file = objects.File(path=note.path, root=note.root)
+
+    try:
+        unchanged = cache.has_no_changes(file)
+        new_content = markup.rename_tags(file, renames)
+    except FileNotFoundError:
+        return None
+
+    if new_content == file.content:
+        return note
+
+    result = scanner.scan(new_content)
+    file.content = new_content
+    new_note = objects.Note(
+        root=note.root,
+        relative_path=note.relative_path,
+        title=result.title or constants.UNKNOWN,
+        tags=sorted(name for _, _, name in result.tags),
+        saved=file.save(writer, cache.algorithm),
+    )
+
+    if unchanged:
+        cache.store_file(new_note, cache.make_fingerprint(file))
+
+    return new_note
@@ -0,0 +1,437 @@
+"""Модуль обработки каталога с заметками.
+"""
+from concurrent.futures import Executor
+from pathlib import Path
+
+from minimus.src import constants
+from minimus.src import disk
+from minimus.src import index
+from minimus.src import markup
+from minimus.src import metrics as metrics_module
+from minimus.src import objects
+from minimus.src import output
+from minimus.src import pipeline
+from minimus.src import search
+from minimus.src import snapshot
+from minimus.src import storage
+from minimus.src import tags
+from minimus.src import vcs
+
+
+def run(
+    path: Path,
+    settings: objects.Settings,
+    cache: objects.Cache,
+    executor: Executor | None = None,
+    metrics: metrics_module.Metrics | None = None,
+    reporter: output.Reporter | None = None,
+    writer: disk.Writer | None = None,
+) -> bool:
+    """Обработать каталог, вернуть False если заметок не нашлось.
+
+    Кеш должен быть уже загружен. После обработки он сохраняется
+    на диск, но остаётся в памяти и пригоден для следующего запуска.
+    Через writer можно узнать, какие файлы были записаны.
+    """
+    metrics = metrics or metrics_module.Metrics()
+    reporter = reporter or output.make_reporter(
+        settings.verbosity,
+        settings.output_format,
+    )
+    writer = writer or disk.Writer(fsync=settings.fsync)
+    changes = None
+
+    if settings.git and not settings.verify:
+        with metrics.phase('git'):
+            changes = vcs.read_changes(path, cache.git_state)
+
+    visited: dict[str, int] = {}
+    found = storage.iter_files(path, visited, with_stat=changes is None)
+    own_executor = executor is None
+    if own_executor:
+        executor = pipeline.make_executor(settings)
+
+    try:
+        with metrics.phase('notes'):
+            files = pipeline.handle_files(
+                found,
+                cache,
+                settings,
+                writer,
+                executor,
+                metrics,
+                reporter.progress,
+                changes,
+            )
+    finally:
+        if own_executor and executor is not None:
+            executor.shutdown()
+
+    with metrics.phase('gather'):
+        cache.forget_missing(files)
+        cache.git_state = {}
+        if changes is not None:
+            cache.git_state = dict(
+                changes.make_state(
+                    note.relative_path.as_posix()
+                    for note in files
+                    if note.saved
+                )
+            )
+        files.sort(key=lambda file: file.sort_key)
+        tag_table = tags.make_tag_table(files)
+        collisions = tag_table.collisions()
+
+    if not tag_table:
+        reporter.event(
+            'empty',
+            f'\nВ каталоге {path.absolute()} заметок не найдено',
+            path=path.absolute(),
+        )
+        reporter.flush()
+        return False
+
+    reporter.header('Сохранение заметок')
+    saved_notes = 0
+    for each_file in files:
+        reporter.note(each_file.relative_path, each_file.saved)
+        saved_notes += each_file.saved
+
+    reporter.event(
+        'notes',
+        f'\tСохранено заметок: {saved_notes} шт. из {len(files)}',
+        saved=saved_notes,
+        total=len(files),
+    )
+
+    moved = metrics.counters.get('notes_moved', 0)
+    if moved:
+        reporter.event(
+            'moved',
+            f'\tПеренесено заметок: {moved} шт.',
+            moved=moved,
+        )
+
+    if changes is not None and changes.counts:
+        counts = changes.counts
+        reporter.event(
+            'git',
+            f'\tИзменения по git: добавлено {counts["added"]}, '
+            f'изменено {counts["modified"]}, '
+            f'удалено {counts["deleted"]}, '
+            f'переименовано {counts["renamed"]}',
+            head=changes.head,
+            **counts,
+        )
+    elif changes is not None:
+        reporter.event(
+            'git',
+            '\tСостояние git запомнено, в этот раз проверены все заметки',
+            head=changes.head,
+        )
+    elif settings.git and not settings.verify:
+        reporter.event(
+            'git_unavailable',
+            '\tКаталог не в репозитории git, изменения искались по файлам',
+            path=path.absolute(),
+        )
+
+    reporter.header('Сохранение тегов')
+    for filename, names in collisions.items():
+        reporter.event(
+            'tag_collision',
+            f'\tОдно имя файла {filename} у тегов: {", ".join(names)}. '
+            f'Документ получит тег {names[0]}',
+            filename=filename,
+            tags=names,
+        )
+
+    with metrics.phase('tag_pages'):
+        saved_tags, removed_tags = save_tag_pages(
+            path=path,
+            settings=settings,
+            cache=cache,
+            writer=writer,
+            tag_table=tag_table,
+        )
+
+    for tag in saved_tags:
+        reporter.event(
+            'tag_saved',
+            f'\t+++ Сохранён тег: {tag}',
+            level='verbose',
+            tag=tag,
+            filename=markup.get_tag_filename(tag),
+        )
+
+    for tag in removed_tags:
+        reporter.event(
+            'tag_removed',
+            f'\t--- Удалён тег: {tag}',
+            level='verbose',
+            tag=tag,
+            filename=markup.get_tag_filename(tag),
+        )
+
+    saved = len(saved_tags)
+    removed = len(removed_tags)
+    unchanged = len(cache.tag_digests) - saved
+    reporter.event(
+        'tags',
+        f'\tСохранено тегов: {saved} шт. \n'
+        f'\tТеги без изменений: {unchanged} шт. \n'
+        f'\tУдалено тегов: {removed} шт. ',
+        saved=saved,
+        unchanged=unchanged,
+        removed=removed,
+    )
+
+    reporter.header('Генерация вспомогательных файлов')
+    if settings.folder_index:
+        with metrics.phase('readme'):
+            indexes_saved, indexes_total = save_folder_indexes(
+                path,
+                files,
+                cache,
+                writer,
+            )
+        reporter.event(
+            'folder_indexes',
+            f'\tСохранено оглавлений каталогов: {indexes_saved} шт. '
+            f'из {indexes_total}',
+            saved=indexes_saved,
+            total=indexes_total,
+        )
+    else:
+        with metrics.phase('readme'):
+            readme_content = markup.make_readme_content(files)
+            readme_path = path / constants.README_FILENAME
+            readme = objects.File(path=readme_path, content=readme_content)
+            readme_saved = readme.save(writer)
+            # общий README заменяет оглавление корня
+            indexes_removed = delete_folder_indexes(
+                path,
+                [name for name in cache.folder_indexes if name != '.'],
+                writer,
+            )
+            cache.folder_indexes = []
+
+        status = 'Сохранён' if readme_saved else 'Не изменился'
+        reporter.event(
+            'readme',
+            f'\t{status}: {readme_path.absolute()}',
+            path=readme_path.absolute(),
+            saved=readme_saved,
+        )
+
+        if indexes_removed:
+            reporter.event(
+                'folder_indexes_removed',
+                f'\tУдалено оглавлений каталогов: {indexes_removed} шт.',
+                removed=indexes_removed,
+            )
+
+    with metrics.phase('cache_save'):
+        cache_saved = cache.save(writer)
+
+    status = 'Сохранён' if cache_saved else 'Не изменился'
+    reporter.event(
+        'cache',
+        f'\t{status}: {cache.full_path.absolute()}',
+        path=cache.full_path.absolute(),
+        saved=cache_saved,
+    )
+
+    if settings.search or search.SearchIndex.exists(path):
+        with metrics.phase('search_index'):
+            search_index = search.SearchIndex(path)
+            indexed = search_index.update(files, cache)
+            search_index.close()
+        metrics.count('search_notes_indexed', indexed)
+        reporter.event(
+            'search_index',
+            f'\tСохранён: {search_index.full_path.absolute()} '
+            f'(обновлено заметок: {indexed})',
+            path=search_index.full_path.absolute(),
+            indexed=indexed,
+        )
+
+    with metrics.phase('index'):
+        tag_index = index.TagIndex.from_table(tag_table, files)
+        index_saved = tag_index.save(path, writer)
+
+    index_path = path / constants.INDEX_FILENAME
+    status = 'Сохранён' if index_saved else 'Не изменился'
+    reporter.event(
+        'index',
+        f'\t{status}: {index_path.absolute()}',
+        path=index_path.absolute(),
+        saved=index_saved,
+    )
+
+    with metrics.phase('snapshot'):
+        snapshot.save(path, settings, cache, files, visited, writer)
+
+    with metrics.phase('flush'):
+        writer.flush()
+
+    metrics.count('notes', len(files))
+    metrics.count('tags', len(tag_table))
+    metrics.count('tag_pages_written', saved)
+    metrics.count('tag_pages_removed', removed)
+    metrics.count('files_written', writer.files_written)
+    metrics.count('files_unchanged', writer.files_skipped)
+    metrics.count('bytes_written', writer.bytes_written)
+    reporter.event(
+        'written',
+        f'\tЗаписано файлов: {writer.files_written} шт., '
+        f'{writer.bytes_written} байт',
+        files=writer.files_written,
+        bytes=writer.bytes_written,
+    )
+
+    return True
+
+
+def save_tag_pages(
+    path: Path,
+    settings: objects.Settings,
+    cache: objects.Cache,
+    writer: disk.Writer,
+    tag_table: tags.TagTable,
+) -> tuple[list[str], list[str]]:
+    """Сохранить изменившиеся документы тегов и удалить исчезнувшие.
+
+    Возвращает теги, документы которых сохранены, и теги, документы
+    которых удалены.
+    """
+    storage.ensure_folder_for_tags(path)
+    tag_digests: dict[str, str] = {}
+    filenames: set[str] = set()
+    saved: list[str] = []
+
+    for tag_id, tag in enumerate(tag_table.names):
+        filename = tag_table.filename(tag_id)
+        filenames.add(filename)
+
+        if not tag_table.owns_page(tag_id):
+            continue
+
+        sub_files = tag_table.notes[tag_id]
+        close_tags = tag_table.neighbours(tag_id, settings.close_tags)
+        tag_path = path / constants.TAGS_FOLDER / filename
+        digest = markup.make_tag_digest(
+            tag=tag,
+            files=sub_files,
+            close_tags=close_tags,
+            page_size=settings.page_size,
+        )
+        tag_digests[tag] = digest
+
+        if (
+            not settings.rebuild
+            and cache.tag_digests.get(tag) == digest
+            and tag_path.exists()
+        ):
+            continue
+
+        pages = markup.make_tag_pages(
+            tag=tag,
+            files=sub_files,
+            close_tags=close_tags,
+            filename=filename,
+            page_size=settings.page_size,
+        )
+        changed = False
+        for page, tag_content in enumerate(pages, start=1):
+            page_filename = markup.get_tag_page_filename(filename, page)
+            tag_object = objects.File(
+                path=path / constants.TAGS_FOLDER / page_filename,
+                content=tag_content,
+            )
+            changed |= tag_object.save(writer)
+
+        delete_tag_pages(path, filename, writer, keep=len(pages))
+        if changed:
+            saved.append(tag)
+
+    removed: list[str] = []
+    for tag in sorted(cache.tag_digests.keys() - tag_digests.keys()):
+        filename = markup.get_tag_filename(tag)
+        if filename not in filenames:
+            delete_tag_pages(path, filename, writer)
+            removed.append(tag)
+
+    cache.tag_digests = tag_digests
+    return saved, removed
+
+
+def delete_tag_pages(
+    path: Path,
+    filename: str,
+    writer: disk.Writer,
+    keep: int = 0,
+) -> None:
+    """Удалить страницы документа тега после первых keep страниц."""
+    page = keep + 1
+
+    while True:
+        page_filename = markup.get_tag_page_filename(filename, page)
+        page_path = path / constants.TAGS_FOLDER / page_filename
+
+        if page > 1 and not page_path.exists():
+            break
+
+        writer.delete(page_path)
+        page += 1
+
+
+def save_folder_indexes(
+    path: Path,
+    files: list[objects.Note],
+    cache: objects.Cache,
+    writer: disk.Writer,
+) -> tuple[int, int]:
+    """Сохранить оглавления каталогов.
+
+    Оглавления прошлых запусков в каталогах, где заметок больше нет,
+    удаляются. Возвращает количество сохранённых оглавлений и общее
+    их количество.
+    """
+    indexes = markup.make_folder_indexes(files)
+    saved = 0
+
+    for folder, content in indexes.items():
+        readme_path = path / folder / constants.README_FILENAME
+        readme = objects.File(path=readme_path, content=content)
+        saved += readme.save(writer)
+
+    folders = sorted(folder.as_posix() for folder in indexes)
+    delete_folder_indexes(
+        path,
+        sorted(set(cache.folder_indexes) - set(folders)),
+        writer,
+    )
+    cache.folder_indexes = folders
+    return saved, len(indexes)
+
+
+def delete_folder_indexes(
+    path: Path,
+    folders: list[str],
+    writer: disk.Writer,
+) -> int:
+    """Удалить оглавления, записанные прошлыми запусками, вернуть их число.
+
+    Какие оглавления записаны нами, известно из кеша, поэтому README,
+    созданные вручную, не трогаются.
+    """
+    removed = 0
+
+    for folder in folders:
+        readme_path = path / folder / constants.README_FILENAME
+        if readme_path.exists():
+            writer.delete(readme_path)
+            removed += 1
+
+    return removed
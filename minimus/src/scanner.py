@@ -0,0 +1,360 @@
+"""Модуль разбора заметки за один проход.
+
+Находит заголовок и все вхождения тегов с точными границами, давая
+те же результаты, что TITLE_PATTERN, BASIC_TAG_PATTERN и
+BARE_TAG_PATTERN, но без возвратов: каждый участок текста
+просматривается ограниченное число раз, поэтому незакрытые скобки
+в длинных строках не замедляют разбор.
+"""
+import re
+from typing import Any
+
+from minimus.src import constants
+
+# Начало, конец и текст тега
+TagSpan = tuple[int, int, str]
+
+
+class Syntax:
+    """Шаблоны разбора для строки или для байтов в кодировке UTF-8."""
+
+    def __init__(
+        self,
+        octothorpe: Any,
+        bracket: Any,
+        closing: Any,
+        space: Any,
+        newline: Any,
+        openers: Any,
+        encoded: bool,
+    ) -> None:
+        """Инициализировать экземпляр."""
+        self.octothorpe = octothorpe
+        self.bracket = bracket
+        self.closing = closing
+        self.encoded = encoded
+
+        def extend(suffix: str) -> re.Pattern:
+            if encoded:
+                return re.compile(space + suffix.encode())
+            return re.compile(space + suffix)
+
+        self.space = re.compile(space)
+        self.spaces = extend('*')
+        self.newline = re.compile(newline)
+        # пробел, за которым сразу идут закрывающие скобки
+        self.closer = extend('(?=}})')
+        # то же, но без квадратной скобки после них
+        self.bare_closer = extend('(?=}}(?!]))')
+        # начало тега, а если это обычный тег из слов через пробел,
+        # то и весь тег: его границы однозначны
+        self.openers = re.compile(openers)
+
+
+TEXT = Syntax(
+    octothorpe='#',
+    bracket='[',
+    closing=']',
+    space=r'\s',
+    newline=r'\n',
+    openers=r'{(?={)(?:{ ([^\s{}]+(?: [^\s{}]+)*) }})?',
+    encoded=False,
+)
+
+# Байты не проходят через универсальные переводы строк,
+# поэтому концом строки считается и \r
+BYTES = Syntax(
+    octothorpe=b'#',
+    bracket=b'[',
+    closing=b']',
+    space=constants.UTF8_SPACE,
+    newline=rb'[\r\n]',
+    openers=rb'{(?={)(?:{ ([^\s{}]+(?: [^\s{}]+)*) }})?',
+    encoded=True,
+)
+
+
+class Scan:
+    """Результат разбора заметки.
+
+    В tags попадают все теги, в том числе уже оформленные ссылками,
+    в bare - только теги простым текстом, которые надо заменить
+    на ссылки. Границы даны в единицах разобранного текста.
+    """
+
+    __slots__ = ('title', 'tags', 'bare')
+
+    def __init__(
+        self,
+        title: str | None,
+        tags: list[TagSpan],
+        bare: list[TagSpan],
+    ) -> None:
+        """Инициализировать экземпляр."""
+        self.title = title
+        self.tags = tags
+        self.bare = bare
+
+
+def scan(text: Any, syntax: Syntax = TEXT) -> Scan:
+    """Разобрать текст заметки.
+
+    >>> result = scan('# Заметка\\n{{ кот }} и [{{ пёс }}](./pyos.md)')
+    >>> result.title
+    'Заметка'
+    >>> result.tags
+    [(10, 19, 'кот'), (23, 32, 'пёс')]
+    >>> result.bare
+    [(10, 19, 'кот')]
+    >>> scan('{{ a\\n{{ b }}').tags
+    [(5, 12, 'b')]
+    """
+    reader = _Reader(text, syntax)
+    title = reader.title()
+    tags, bare = reader.tags()
+    return Scan(title, tags, bare)
+
+
+class _Forward:
+    """Поиск следующего совпадения для растущих позиций.
+
+    Найденное совпадение переиспользуется, пока запрошенная позиция
+    до него не дошла, так что текст просматривается один раз.
+    """
+
+    def __init__(self, pattern: re.Pattern, text: Any) -> None:
+        """Инициализировать экземпляр."""
+        self.pattern = pattern
+        self.text = text
+        self._position: int | None = None
+        self._match: re.Match | None = None
+
+    def find(self, position: int) -> re.Match | None:
+        """Вернуть первое совпадение не раньше позиции."""
+        if (
+            self._position is not None
+            and self._position <= position
+            and (self._match is None or self._match.start() >= position)
+        ):
+            return self._match
+
+        self._position = position
+        self._match = self.pattern.search(self.text, position)
+        return self._match
+
+
+class _Spaces:
+    """Поиск конца пробелов, начинающихся с позиции.
+
+    Последний найденный участок запоминается: для любой позиции
+    внутри него ответ тот же.
+    """
+
+    def __init__(self, pattern: re.Pattern, text: Any) -> None:
+        """Инициализировать экземпляр."""
+        self.pattern = pattern
+        self.text = text
+        self._start = -1
+        self._end = -1
+
+    def end(self, position: int) -> int:
+        """Вернуть позицию первого символа после пробелов."""
+        if not self._start <= position <= self._end:
+            self._start = position
+            self._end = self.pattern.match(self.text, position).end()
+        return self._end
+
+
+class _Reader:
+    """Разбор одного текста."""
+
+    def __init__(self, text: Any, syntax: Syntax) -> None:
+        """Инициализировать экземпляр."""
+        self.text = text
+        self.syntax = syntax
+        self.size = len(text)
+        self.newlines = _Forward(syntax.newline, text)
+        self.closers = _Forward(syntax.closer, text)
+        self.bare_closers = _Forward(syntax.bare_closer, text)
+        # пробелы после открывающих скобок и перед закрывающими
+        # просматриваются независимо, у каждых своя память
+        self.leading_spaces = _Spaces(syntax.spaces, text)
+        self.closing_spaces = _Spaces(syntax.spaces, text)
+
+    def decode(self, start: int, end: int) -> str:
+        """Вернуть участок текста строкой."""
+        chunk = self.text[start:end]
+        if self.syntax.encoded:
+            return chunk.decode('utf-8')
+        return chunk
+
+    def after_space(self, position: int) -> int | None:
+        """Вернуть позицию за одним пробелом, None если его нет."""
+        match = self.syntax.space.match(self.text, position)
+        return None if match is None else match.end()
+
+    def next_newline(self, position: int) -> int:
+        """Вернуть позицию ближайшего перевода строки или конец текста."""
+        match = self.newlines.find(position)
+        return self.size if match is None else match.start()
+
+    def title(self) -> str | None:
+        """Найти заголовок в начале текста."""
+        if self.text[:1] != self.syntax.octothorpe:
+            return None
+
+        start = self.after_space(1)
+        if start is None:
+            return None
+
+        # текст заголовка может начаться только в пределах пробелов
+        limit = self.leading_spaces.end(1)
+
+        while start <= limit:
+            newline = self.next_newline(start)
+            if start < newline:
+                return self.decode(start, newline)
+            start += 1
+
+        return None
+
+    def tags(self) -> tuple[list[TagSpan], list[TagSpan]]:
+        """Найти все теги и отдельно теги простым текстом.
+
+        Вхождения не пересекаются, как у finditer, причём для тегов
+        простым текстом счёт идёт отдельно: их границы могут
+        не совпасть с границами обычного поиска.
+        """
+        text = self.text
+        bracket = self.syntax.bracket
+        closing = self.syntax.closing
+        encoded = self.syntax.encoded
+        tags: list[TagSpan] = []
+        bare: list[TagSpan] = []
+        tags_from = bare_from = 0
+
+        for found in self.syntax.openers.finditer(text):
+            position = found.start()
+            want_tag = position >= tags_from
+            want_bare = (
+                position >= bare_from
+                and text[position - 1:position] != bracket
+            )
+            tag = bare_tag = None
+
+            name = found.group(1)
+
+            if name is not None:
+                if encoded:
+                    name = name.decode('utf-8')
+
+                # в байтах последним может оказаться пробел не из ASCII
+                if not name[-1].isspace():
+                    end = found.end()
+
+                    if want_tag:
+                        tag = (position, end, name)
+                        want_tag = False
+
+                    if want_bare and text[end:end + 1] != closing:
+                        bare_tag = (position, end, name)
+                        want_bare = False
+
+            if want_tag or want_bare:
+                other_tag, other_bare = self.match(
+                    position,
+                    want_tag,
+                    want_bare,
+                )
+                tag = tag or other_tag
+                bare_tag = bare_tag or other_bare
+
+            if tag is not None:
+                tags.append(tag)
+                tags_from = tag[1]
+
+            if bare_tag is not None:
+                bare.append(bare_tag)
+                bare_from = bare_tag[1]
+
+        return tags, bare
+
+    def match(
+        self,
+        position: int,
+        want_tag: bool,
+        want_bare: bool,
+    ) -> tuple[TagSpan | None, TagSpan | None]:
+        """Сопоставить тег, начинающийся с открывающих скобок.
+
+        Текст тега начинается после хотя бы одного пробела. Если
+        закрывающие скобки не найдены до конца строки, пробует
+        начать текст тега после перевода строки среди пробелов,
+        как это сделал бы ленивый квантификатор.
+        """
+        tag = bare_tag = None
+        start = self.after_space(position + 2)
+        if start is None:
+            return None, None
+
+        limit = self.leading_spaces.end(position + 2)
+
+        while start <= limit and (want_tag or want_bare):
+            newline = self.next_newline(start)
+
+            if start < newline:
+                end = self.close(self.closers, start, newline)
+
+                # дальние скобки не подходят, если не подошли ближние,
+                # поэтому без них не найдётся и тега простым текстом
+                if end is not None:
+                    name = self.name(start, end)
+
+                    if want_tag:
+                        tag = (position, end + 2, name)
+                        want_tag = False
+
+                    if want_bare:
+                        if self.text[end + 2:end + 3] == self.syntax.closing:
+                            end = self.close(self.bare_closers, start, newline)
+                            if end is not None:
+                                name = self.name(start, end)
+
+                        if end is not None:
+                            bare_tag = (position, end + 2, name)
+                            want_bare = False
+
+            if newline >= limit:
+                break
+            start = newline + 1
+
+        return tag, bare_tag
+
+    def close(
+        self,
+        closers: _Forward,
+        start: int,
+        newline: int,
+    ) -> int | None:
+        """Вернуть позицию закрывающих скобок для текста тега.
+
+        Текст тега не длиннее строки, а пробелы перед скобками
+        могут переносить строку. Подходят только первые скобки
+        после начала текста: если не подошли они, дальние тем более.
+        """
+        match = closers.find(start + 1)
+
+        if match is None:
+            return None
+
+        end = match.end()
+
+        if match.start() <= newline or self.closing_spaces.end(newline) == end:
+            return end
+
+        return None
+
+    def name(self, start: int, end: int) -> str:
+        """Вернуть текст тега без пробелов перед закрывающими скобками."""
+        chunk = self.decode(start, end)
+        return chunk.rstrip() or chunk[0]
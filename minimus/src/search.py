@@ -0,0 +1,268 @@
+"""Модуль полнотекстового поиска по заметкам.
+"""
+from collections import Counter
+import math
+from pathlib import Path
+import re
+import sqlite3
+from typing import Iterable
+from typing import Iterator
+from typing import TypedDict
+
+from minimus.src import constants
+from minimus.src import objects
+
+WORD_PATTERN = re.compile(r'\w{2,}')
+
+# Адреса гиперссылок в поиск не попадают, только их текст
+LINK_TARGET_PATTERN = re.compile(r'\]\([^)]*\)')
+
+# Больше любого символа, ограничивает поиск слов по началу
+PREFIX_END = chr(0x10FFFF)
+
+# Сколько символов строки показывать в отрывке
+SNIPPET_LENGTH = 160
+
+
+class SearchResult(TypedDict):
+    """Найденная заметка."""
+    path: str
+    title: str
+    score: float
+    snippet: str
+
+
+def normalize(word: str) -> str:
+    """Привести слово к виду, в котором оно хранится в индексе.
+
+    >>> normalize('Ёжик')
+    'ezhik'
+    """
+    return word.lower().translate(constants.TRANS_MAP)
+
+
+def tokenize(text: str) -> Iterator[str]:
+    """Выдать нормализованные слова текста.
+
+    >>> list(tokenize('Два [весёлых](./гуся.md) гуся'))
+    ['dva', 'veselyh', 'gusya']
+    """
+    text = LINK_TARGET_PATTERN.sub(']', text)
+    for match in WORD_PATTERN.finditer(text):
+        yield normalize(match.group())
+
+
+class SearchIndex:
+    """Обратный индекс слов в теле заметок, хранится в базе SQLite.
+
+    Для каждой заметки запоминается контрольная сумма из кеша,
+    поэтому при обновлении заново разбираются только заметки,
+    которые изменились или ещё не попали в индекс.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Инициализировать экземпляр."""
+        self.path = path
+        self.full_path = path / constants.SEARCH_INDEX_FILENAME
+        self.connection = sqlite3.connect(self.full_path)
+
+        if self._read_version() != str(constants.SEARCH_INDEX_VERSION):
+            self._create_schema()
+
+    @classmethod
+    def exists(cls, path: Path) -> bool:
+        """Вернуть True, если индекс для каталога уже заведён."""
+        return (path / constants.SEARCH_INDEX_FILENAME).exists()
+
+    def close(self) -> None:
+        """Закрыть базу."""
+        self.connection.close()
+
+    def _read_version(self) -> str | None:
+        """Прочитать версию схемы, если она есть."""
+        try:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = 'version'"
+            ).fetchone()
+        except sqlite3.DatabaseError:
+            return None
+        return row[0] if row else None
+
+    def _create_schema(self) -> None:
+        """Создать таблицы с нуля."""
+        with self.connection:
+            self.connection.executescript(
+                """
+                DROP TABLE IF EXISTS meta;
+                DROP TABLE IF EXISTS notes;
+                DROP TABLE IF EXISTS postings;
+                CREATE TABLE meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                CREATE TABLE notes (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    title TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    length INTEGER NOT NULL
+                );
+                CREATE TABLE postings (
+                    term TEXT NOT NULL,
+                    note_id INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (term, note_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX postings_by_note ON postings (note_id);
+                """
+            )
+            self.connection.execute(
+                'INSERT INTO meta (key, value) VALUES (?, ?)',
+                ('version', str(constants.SEARCH_INDEX_VERSION)),
+            )
+
+    def update(
+        self,
+        notes: Iterable[objects.Note],
+        cache: objects.Cache,
+    ) -> int:
+        """Обновить индекс, вернуть количество разобранных заметок."""
+        stored = {
+            path: (note_id, file_hash)
+            for note_id, path, file_hash in self.connection.execute(
+                'SELECT id, path, hash FROM notes'
+            )
+        }
+        fingerprints = cache.get_fingerprints()
+        indexed = 0
+
+        with self.connection:
+            for note in notes:
+                key = note.relative_path.as_posix()
+                fingerprint = fingerprints.get(key)
+                file_hash = fingerprint['hash'] if fingerprint else ''
+                note_id, stored_hash = stored.pop(key, (None, None))
+
+                if note_id is not None and stored_hash == file_hash:
+                    continue
+
+                if note_id is not None:
+                    self._delete(note_id)
+
+                with open(note.path, mode='r', encoding='utf-8') as file:
+                    counts = Counter(tokenize(file.read()))
+
+                cursor = self.connection.execute(
+                    'INSERT INTO notes (path, title, hash, length) '
+                    'VALUES (?, ?, ?, ?)',
+                    (key, note.title, file_hash, sum(counts.values())),
+                )
+                self.connection.executemany(
+                    'INSERT INTO postings VALUES (?, ?, ?)',
+                    (
+                        (term, cursor.lastrowid, count)
+                        for term, count in counts.items()
+                    ),
+                )
+                indexed += 1
+
+            for note_id, _ in stored.values():
+                self._delete(note_id)
+
+        return indexed
+
+    def _delete(self, note_id: int) -> None:
+        """Удалить заметку из индекса."""
+        self.connection.execute(
+            'DELETE FROM postings WHERE note_id = ?',
+            (note_id,),
+        )
+        self.connection.execute('DELETE FROM notes WHERE id = ?', (note_id,))
+
+    def search(self, text: str, limit: int = 20) -> list[SearchResult]:
+        """Найти заметки по словам, самые подходящие первыми.
+
+        Каждое слово запроса ищется как начало слова в заметке, так что
+        'ежик' найдёт и 'ёжика'. Вес заметки - сумма tf-idf по словам
+        запроса, делённая на корень из длины заметки, чтобы длинные
+        заметки не выигрывали только за счёт объёма.
+        """
+        terms = sorted(set(tokenize(text)))
+
+        if not terms:
+            return []
+
+        total, = self.connection.execute(
+            'SELECT COUNT(*) FROM notes'
+        ).fetchone()
+        scores: dict[int, float] = {}
+        lengths: dict[int, int] = {}
+
+        for term in terms:
+            postings = self.connection.execute(
+                'SELECT note_id, SUM(count), length FROM postings '
+                'JOIN notes ON notes.id = postings.note_id '
+                'WHERE term >= ? AND term < ? GROUP BY note_id',
+                (term, term + PREFIX_END),
+            ).fetchall()
+
+            if not postings:
+                continue
+
+            idf = math.log(1 + total / len(postings))
+            for note_id, count, length in postings:
+                weight = (1 + math.log(count)) * idf
+                scores[note_id] = scores.get(note_id, 0.0) + weight
+                lengths[note_id] = length
+
+        ranked = sorted(
+            (
+                (note_id, score / math.sqrt(max(lengths[note_id], 1)))
+                for note_id, score in scores.items()
+            ),
+            key=lambda item: (-item[1], item[0]),
+        )
+
+        results: list[SearchResult] = []
+        for note_id, score in ranked[:limit]:
+            path, title = self.connection.execute(
+                'SELECT path, title FROM notes WHERE id = ?',
+                (note_id,),
+            ).fetchone()
+            results.append(
+                SearchResult(
+                    path=path,
+                    title=title,
+                    score=round(score, 4),
+                    snippet=self.make_snippet(path, terms),
+                )
+            )
+
+        return results
+
+    def make_snippet(self, path: str, terms: list[str]) -> str:
+        """Вернуть первую строку заметки, где встречается слово запроса."""
+        prefixes = tuple(terms)
+
+        try:
+            with open(self.path / path, mode='r', encoding='utf-8') as file:
+                for line in file:
+                    if any(
+                        word.startswith(prefixes) for word in tokenize(line)
+                    ):
+                        return shorten(line.strip(), SNIPPET_LENGTH)
+        except OSError:
+            pass
+
+        return ''
+
+
+def shorten(text: str, length: int) -> str:
+    """Обрезать текст до заданной длины.
+
+    >>> shorten('abcdef', 4)
+    'abc…'
+    """
+    if len(text) <= length:
+        return text
+    return text[:length - 1] + '…'
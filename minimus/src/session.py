@@ -0,0 +1,141 @@
+"""Модуль для встраивания обработки в другие программы.
+"""
+from pathlib import Path
+import time
+from types import TracebackType
+from typing import Any
+from typing import TypedDict
+
+from minimus.src import metrics
+from minimus.src import objects
+from minimus.src import output
+from minimus.src import pipeline
+from minimus.src import runner
+from minimus.src import snapshot
+from minimus.src import storage
+
+
+class RunResult(TypedDict):
+    """Итог обработки каталога.
+
+    Пути заметок даны относительно корня. В events - все события
+    обработки в том виде, в каком их выводит --format json. Если
+    с прошлого раза ничего не менялось (unchanged), заметки
+    не перебирались, notes равно нулю, а found взят из прошлой
+    обработки.
+    """
+    path: Path
+    found: bool
+    unchanged: bool
+    notes: int
+    saved_notes: list[Path]
+    saved_tags: list[str]
+    removed_tags: list[str]
+    seconds: float
+    phases: dict[str, float]
+    counters: dict[str, int]
+    events: list[dict[str, Any]]
+
+
+class Session:
+    """Обработка одного каталога, которая помнит кеш между вызовами.
+
+    Кеш читается с диска только при первой обработке, пул исполнителей
+    создаётся один раз, поэтому повторные вызовы run стоят ровно
+    столько, сколько проверка изменившихся заметок. На экран ничего
+    не выводится. Один экземпляр нельзя использовать из нескольких
+    потоков одновременно.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        options: objects.Settings | None = None,
+    ) -> None:
+        """Инициализировать экземпляр."""
+        self.path = storage.get_path(str(root))
+        self.settings = options or objects.Settings()
+        self.cache: objects.Cache | None = None
+        self.executor = pipeline.make_executor(self.settings)
+        # снимок сохраняется только после обработки, нашедшей заметки,
+        # поэтому без обработки в этом сеансе считается, что они есть
+        self.found = True
+
+    def __enter__(self) -> 'Session':
+        """Начать работу."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Закончить работу."""
+        self.close()
+
+    def close(self) -> None:
+        """Остановить пул исполнителей и закрыть кеш."""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def run(self) -> RunResult:
+        """Обработать каталог так же, как это делает команда minimus."""
+        start_time = time.perf_counter()
+        run_metrics = metrics.Metrics()
+        recorder = output.Recorder()
+        found = self.found
+
+        with run_metrics.phase('snapshot'):
+            unchanged = snapshot.is_unchanged(self.path, self.settings)
+
+        if not unchanged:
+            if self.cache is None:
+                self.cache = objects.make_cache(self.path, self.settings)
+                with run_metrics.phase('cache_load'):
+                    self.cache.load()
+
+            found = runner.run(
+                self.path,
+                self.settings,
+                self.cache,
+                executor=self.executor,
+                metrics=run_metrics,
+                reporter=recorder,
+            )
+            self.found = found
+
+        def collect(name: str, key: str) -> list[Any]:
+            return [
+                event[key]
+                for event in recorder.events
+                if event['event'] == name
+            ]
+
+        return RunResult(
+            path=self.path,
+            found=found,
+            unchanged=unchanged,
+            notes=run_metrics.counters.get('notes', 0),
+            saved_notes=collect('note_saved', 'path'),
+            saved_tags=collect('tag_saved', 'tag'),
+            removed_tags=collect('tag_removed', 'tag'),
+            seconds=time.perf_counter() - start_time,
+            phases=dict(run_metrics.phases),
+            counters=dict(run_metrics.counters),
+            events=recorder.events,
+        )
+
+
+def run(
+    root: str | Path,
+    options: objects.Settings | None = None,
+) -> RunResult:
+    """Обработать каталог один раз и вернуть итог."""
+    with Session(root, options) as session:
+        return session.run()
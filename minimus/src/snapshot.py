@@ -0,0 +1,227 @@
+"""Модуль снимка каталога для быстрых запусков без изменений.
+"""
+import json
+import os
+from pathlib import Path
+import time
+from typing import Any
+
+from minimus.src import constants
+from minimus.src import disk
+from minimus.src import objects
+from minimus.src import storage
+
+# Файлы, изменённые незадолго до снимка, могли поменяться ещё раз
+# в пределах точности времени файловой системы, им снимок не верит
+RACY_INTERVAL_NS = 2_000_000_000
+
+
+def make_signature(settings: objects.Settings) -> list[Any]:
+    """Вернуть настройки, от которых зависит результат обработки."""
+    return [
+        settings.algorithm,
+        settings.cache,
+        settings.close_tags,
+        settings.page_size,
+        settings.folder_index,
+        settings.search,
+    ]
+
+
+def read_settings(path: Path) -> objects.Settings | None:
+    """Вернуть настройки, с которыми каталог обработан в прошлый раз.
+
+    Нужны командам, которые меняют уже обработанный каталог: документы
+    тегов должны остаться такими, какими их сделал прошлый запуск.
+    """
+    data = _read(path)
+    if data is None:
+        return None
+
+    (
+        algorithm,
+        cache,
+        close_tags,
+        page_size,
+        folder_index,
+        search,
+    ) = data['settings']
+    return objects.Settings(
+        algorithm=algorithm,
+        cache=cache,
+        close_tags=close_tags,
+        page_size=page_size,
+        folder_index=folder_index,
+        search=search,
+    )
+
+
+def save(
+    path: Path,
+    settings: objects.Settings,
+    cache: objects.Cache,
+    notes: list[objects.Note],
+    visited: dict[str, int],
+    writer: disk.Writer,
+) -> Path:
+    """Запомнить состояние каталога после обработки.
+
+    Для заметок берутся слепки из кеша, то есть то состояние, которое
+    действительно было обработано. Время изменения каталогов берётся
+    на момент чтения их содержимого, а у каталогов, куда writer
+    записывал файлы, - заново, уже после записи.
+    """
+    full_path = path / constants.SNAPSHOT_FILENAME
+    root = str(path)
+    files: dict[str, list[int]] = {}
+    fingerprints = cache.get_fingerprints()
+
+    for note in notes:
+        fingerprint = fingerprints.get(cache.get_key(note))
+        if fingerprint is None:
+            continue
+        files[note.relative_path.as_posix()] = [
+            fingerprint['size'],
+            fingerprint['modified'],
+            fingerprint['inode'],
+        ]
+
+    # временные файлы и os.replace меняют время изменения каталога
+    written_folders = {str(written.parent) for written in writer.written}
+    folders = {}
+    for folder, modified in visited.items():
+        if folder == root:
+            continue
+        if written_folders and os.path.realpath(folder) in written_folders:
+            modified = os.stat(folder).st_mtime_ns
+        folders[Path(folder).relative_to(path).as_posix()] = modified
+    top_level = sorted(
+        {name for name in files if '/' not in name}
+        | {name for name in folders if '/' not in name}
+    )
+    tags_path = path / constants.TAGS_FOLDER
+
+    data = {
+        'version': constants.SNAPSHOT_VERSION,
+        'settings': make_signature(settings),
+        'time': time.time_ns(),
+        'top_level': top_level,
+        'folders': folders,
+        'files': files,
+        'tags': os.stat(tags_path).st_mtime_ns,
+    }
+    writer.write(full_path, json.dumps(data, ensure_ascii=False))
+    return full_path
+
+
+def is_unchanged(path: Path, settings: objects.Settings) -> bool:
+    """Вернуть True, если с прошлого запуска в каталоге ничего не менялось.
+
+    Читается только сам снимок: каталоги и заметки сверяются по stat,
+    содержимое корня - по списку имён. Ни кеш, ни заметки, ни документы
+    тегов при этом не открываются.
+    """
+    if settings.rebuild or settings.verify:
+        return False
+
+    data = _read(path)
+    if data is None or data['settings'] != make_signature(settings):
+        return False
+
+    try:
+        return (
+            _same_top_level(path, data['top_level'])
+            and _same_folders(path, data['folders'])
+            and _same_files(path, data['files'], data['time'])
+            and os.stat(path / constants.TAGS_FOLDER).st_mtime_ns
+            == data['tags']
+            and _outputs_exist(path, settings)
+        )
+    except OSError:
+        return False
+
+
+def _read(path: Path) -> dict[str, Any] | None:
+    """Прочитать снимок, вернуть None если его нет или он устарел."""
+    try:
+        with open(
+            path / constants.SNAPSHOT_FILENAME,
+            mode='r',
+            encoding='utf-8',
+        ) as file:
+            data = json.load(file)
+    except (FileNotFoundError, json.decoder.JSONDecodeError):
+        return None
+
+    if data.get('version') != constants.SNAPSHOT_VERSION:
+        return None
+
+    return data
+
+
+def _same_top_level(path: Path, expected: list[str]) -> bool:
+    """Сверить заметки и каталоги в корне.
+
+    Время изменения корня не годится: в нём лежат кеш и индексы,
+    которые переписываются при каждом запуске.
+    """
+    names = []
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                if storage.can_handle_this_file(entry.name):
+                    names.append(entry.name)
+            elif entry.is_dir() and storage.can_handle_this_folder(
+                entry.name
+            ):
+                names.append(entry.name)
+
+    return sorted(names) == expected
+
+
+def _same_folders(path: Path, expected: dict[str, int]) -> bool:
+    """Сверить время изменения вложенных каталогов."""
+    root = str(path)
+    for folder, modified in expected.items():
+        if os.stat(os.path.join(root, folder)).st_mtime_ns != modified:
+            return False
+    return True
+
+
+def _same_files(
+    path: Path,
+    expected: dict[str, list[int]],
+    snapshot_time: int,
+) -> bool:
+    """Сверить размер, время изменения и inode заметок."""
+    root = str(path)
+    racy_after = snapshot_time - RACY_INTERVAL_NS
+
+    for name, (size, modified, inode) in expected.items():
+        stat = os.stat(os.path.join(root, name))
+
+        if (
+            stat.st_size != size
+            or stat.st_mtime_ns != modified
+            or stat.st_ino != inode
+            or modified >= racy_after
+        ):
+            return False
+
+    return True
+
+
+def _outputs_exist(path: Path, settings: objects.Settings) -> bool:
+    """Проверить, что служебные файлы прошлого запуска на месте."""
+    outputs = [
+        constants.INDEX_FILENAME,
+        constants.SQLITE_CACHE_FILENAME
+        if settings.cache == 'sqlite'
+        else constants.CACHE_FILENAME,
+    ]
+
+    if not settings.folder_index:
+        outputs.append(constants.README_FILENAME)
+
+    return all((path / name).exists() for name in outputs)
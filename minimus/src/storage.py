@@ -2,23 +2,14 @@
 """
 import os
 from pathlib import Path
-import sys
+from typing import Iterator
 
 from minimus.src import constants
 from minimus.src import objects
 
 
-def get_path() -> Path:
+def get_path(raw_path: str = '.') -> Path:
     """Верни корневой каталог, в котором хранятся заметки."""
-    match sys.argv:
-        case [_]:
-            raw_path = '.'
-        case [_, raw_path]:
-            pass
-        case _:
-            msg = 'Для запуска Minimus требуется указать корневой каталог'
-            raise ValueError(msg)
-
     match raw_path:
         case '.':
             path = Path(os.getcwd())
@@ -38,31 +29,44 @@ def get_path() -> Path:
 
 def get_files(path: Path) -> list[objects.File]:
     """Собрать файлы."""
-    files: list[objects.File] = []
-    _recursively_dig(path, path, files)
-    return files
+    return list(iter_files(path))
 
 
-def _recursively_dig(
+def iter_files(
     root: Path,
-    path: Path,
-    files: list[objects.File],
-) -> None:
-    """Рекурсивно собрать данные по всем файлам в каталоге."""
-    entries: list[str] = os.listdir(path)
-
-    for name in entries:
-        sub_path = path / name
-
-        if sub_path.is_file():
-            if can_handle_this_file(name):
-                new_file = objects.File(
-                    path=sub_path,
-                    root=root,
-                )
-                files.append(new_file)
-        elif can_handle_this_folder(name):
-            _recursively_dig(root, sub_path, files)
+    visited: dict[str, int] | None = None,
+    with_stat: bool = True,
+) -> Iterator[objects.File]:
+    """Обойти каталог и выдавать файлы по мере нахождения.
+
+    Обход идёт без рекурсии, поэтому глубина каталогов не ограничена.
+    Данные stat берутся из os.scandir и сохраняются в файле, чтобы
+    при поиске изменений не запрашивать их повторно. Без with_stat
+    они не запрашиваются вовсе, пока не понадобятся. Если передан
+    словарь visited, в него записывается время изменения каждого
+    каталога на момент, когда его содержимое было прочитано.
+    """
+    folders: list[str] = [str(root)]
+
+    while folders:
+        folder = folders.pop()
+
+        if visited is not None:
+            visited[folder] = os.stat(folder).st_mtime_ns
+
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    if can_handle_this_file(entry.name):
+                        new_file = objects.File(
+                            path=Path(entry.path),
+                            root=root,
+                        )
+                        if with_stat:
+                            new_file.stat = entry.stat()
+                        yield new_file
+                elif entry.is_dir() and can_handle_this_folder(entry.name):
+                    folders.append(entry.path)
 
 
 def can_handle_this_file(name: str) -> bool:
@@ -79,6 +83,18 @@ def can_handle_this_file(name: str) -> bool:
     return True
 
 
+def is_note_path(relative_path: str) -> bool:
+    """Вернуть True если по относительному пути лежит заметка.
+
+    >>> is_note_path('folder/note.md'), is_note_path('.hidden/note.md')
+    (True, False)
+    """
+    *folders, name = relative_path.split('/')
+    return can_handle_this_file(name) and all(
+        can_handle_this_folder(folder) for folder in folders
+    )
+
+
 def can_handle_this_folder(name: str) -> bool:
     """Вернуть True если мы умеем обрабатывать такие каталоги."""
     if name.lower().startswith(constants.IGNORED_PREFIXES):
@@ -93,3 +109,8 @@ def can_handle_this_folder(name: str) -> bool:
 def ensure_folder_for_tags(path: Path) -> None:
     """Создать каталог для тегов, если такового нет."""
     (path / constants.TAGS_FOLDER).mkdir(exist_ok=True)
+
+
+def delete_file(path: Path) -> None:
+    """Удалить файл, если он существует."""
+    path.unlink(missing_ok=True)
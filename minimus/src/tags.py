@@ -0,0 +1,130 @@
+"""Модуль таблицы тегов.
+"""
+from itertools import combinations
+
+from minimus.src import objects
+from minimus.src import utils
+
+
+class TagTable:
+    """Таблица всех тегов хранилища.
+
+    Каждому тегу присваивается целочисленный номер, дальше все связи
+    между тегами хранятся через номера. Совместная встречаемость тегов
+    хранится как разреженная таблица счётчиков: сколько заметок содержит
+    оба тега сразу.
+    """
+
+    def __init__(self) -> None:
+        """Инициализировать экземпляр."""
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+        self.notes: list[list[objects.Note]] = []
+        self.weights: list[dict[int, int]] = []
+        self._filenames: list[str | None] = []
+        self._owners: dict[str, int] = {}
+        self._collisions: dict[str, set[int]] = {}
+
+    def __len__(self) -> int:
+        """Вернуть количество тегов."""
+        return len(self.names)
+
+    def __contains__(self, tag: str) -> bool:
+        """Вернуть True, если такой тег встречался."""
+        return tag in self.ids
+
+    def intern(self, tag: str) -> int:
+        """Вернуть номер тега, при необходимости заведя новый."""
+        tag_id = self.ids.get(tag)
+
+        if tag_id is None:
+            tag_id = len(self.names)
+            self.ids[tag] = tag_id
+            self.names.append(tag)
+            self.notes.append([])
+            self.weights.append({})
+            self._filenames.append(None)
+
+        return tag_id
+
+    def add_note(self, note: objects.Note) -> None:
+        """Учесть теги заметки и их совместную встречаемость."""
+        tag_ids = sorted({self.intern(tag) for tag in note.tags})
+
+        for tag_id in tag_ids:
+            self.notes[tag_id].append(note)
+
+        for first, second in combinations(tag_ids, 2):
+            first_weights = self.weights[first]
+            second_weights = self.weights[second]
+            first_weights[second] = first_weights.get(second, 0) + 1
+            second_weights[first] = second_weights.get(first, 0) + 1
+
+    def filename(self, tag_id: int) -> str:
+        """Вернуть имя файла для тега, вычислив его один раз.
+
+        Если разные теги дают одно и то же имя файла, документ
+        достаётся тегу, который раньше по алфавиту, а коллизия
+        запоминается.
+        """
+        filename = self._filenames[tag_id]
+
+        if filename is None:
+            filename = utils.transliterate(self.names[tag_id]) + '.md'
+            self._filenames[tag_id] = filename
+            owner = self._owners.setdefault(filename, tag_id)
+
+            if owner != tag_id:
+                self._collisions.setdefault(filename, {owner}).add(tag_id)
+
+                if self.names[tag_id] < self.names[owner]:
+                    self._owners[filename] = tag_id
+
+        return filename
+
+    def owns_page(self, tag_id: int) -> bool:
+        """Вернуть True, если документ тега не занят другим тегом."""
+        return self._owners[self.filename(tag_id)] == tag_id
+
+    def collisions(self) -> dict[str, list[str]]:
+        """Вернуть теги, которым досталось одинаковое имя файла."""
+        for tag_id in range(len(self.names)):
+            self.filename(tag_id)
+
+        return {
+            filename: sorted(self.names[tag_id] for tag_id in tag_ids)
+            for filename, tag_ids in sorted(self._collisions.items())
+        }
+
+    def neighbours(
+        self,
+        tag_id: int,
+        limit: int | None = None,
+    ) -> list[tuple[str, str]]:
+        """Вернуть близкие теги и их имена файлов.
+
+        Сначала идут теги, чаще всего встречающиеся вместе с данным,
+        при равенстве - по алфавиту.
+        """
+        ranked = sorted(
+            self.weights[tag_id].items(),
+            key=lambda item: (-item[1], self.names[item[0]]),
+        )
+
+        if limit is not None:
+            ranked = ranked[:limit]
+
+        return [
+            (self.names[other_id], self.filename(other_id))
+            for other_id, _ in ranked
+        ]
+
+
+def make_tag_table(notes: list[objects.Note]) -> TagTable:
+    """Собрать таблицу тегов по обработанным заметкам."""
+    table = TagTable()
+
+    for note in notes:
+        table.add_note(note)
+
+    return table
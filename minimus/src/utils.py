@@ -1,8 +1,12 @@
 """Утилиты.
 """
+import hashlib
+from typing import Any
+from typing import Callable
 from typing import Iterable
 from typing import Iterator
 from typing import TypeVar
+import zlib
 
 from minimus.src import constants
 
@@ -45,3 +49,49 @@ def transliterate(something: str) -> str:
     'regnum_dei'
     """
     return something.lower().translate(constants.TRANS_MAP)
+
+
+def decode_text(data: Any) -> str:
+    """Декодировать байты так же, как их прочитал бы open в режиме 'r'.
+
+    >>> decode_text('а\\r\\nб\\rв'.encode('utf-8'))
+    'а\\nб\\nв'
+    """
+    return str(data, 'utf-8').replace('\r\n', '\n').replace('\r', '\n')
+
+
+class Checksum:
+    """Контрольная сумма из zlib с интерфейсом как у hashlib."""
+
+    def __init__(self, function: Callable[..., int]) -> None:
+        """Инициализировать экземпляр."""
+        self._function = function
+        self._value = function(b'')
+
+    def update(self, data: bytes) -> None:
+        """Добавить данные."""
+        self._value = self._function(data, self._value)
+
+    def hexdigest(self) -> str:
+        """Вернуть контрольную сумму в виде строки.
+
+        >>> checksum = Checksum(zlib.crc32)
+        >>> checksum.update(b'minimus')
+        >>> checksum.hexdigest()
+        'e391282a'
+        """
+        return f'{self._value:08x}'
+
+
+def make_hash(algorithm: str) -> Any:
+    """Создать объект для подсчёта контрольной суммы."""
+    match algorithm:
+        case 'crc32':
+            return Checksum(zlib.crc32)
+        case 'adler32':
+            return Checksum(zlib.adler32)
+        case _ if algorithm in constants.HASH_ALGORITHMS:
+            return hashlib.new(algorithm)
+
+    msg = f'Неизвестный алгоритм контрольной суммы: {algorithm!r}'
+    raise ValueError(msg)
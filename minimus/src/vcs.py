@@ -0,0 +1,172 @@
+"""Модуль поиска изменённых заметок средствами git.
+"""
+import os
+from pathlib import Path
+import subprocess
+from typing import Iterable
+from typing import TypedDict
+
+from minimus.src import storage
+
+# Буквы состояния в выводе git diff --name-status
+STATUS_NAMES = {
+    'A': 'added',
+    'C': 'added',
+    'M': 'modified',
+    'T': 'modified',
+    'D': 'deleted',
+    'R': 'renamed',
+}
+
+
+class GitState(TypedDict):
+    """Состояние репозитория на момент прошлого запуска."""
+    head: str
+    dirty: list[str]
+
+
+class GitChanges:
+    """Изменения заметок с прошлого запуска по данным git.
+
+    В tracked - заметки под контролем git, в changed - те, что могли
+    измениться с прошлого запуска. Отслеживаемым заметкам не из changed
+    можно верить без проверки. В dirty - заметки, которые сейчас
+    отличаются от HEAD: их придётся проверить и в следующий раз.
+    """
+
+    def __init__(
+        self,
+        head: str,
+        tracked: set[str],
+        changed: set[str],
+        dirty: set[str],
+        counts: dict[str, int],
+    ) -> None:
+        """Инициализировать экземпляр."""
+        self.head = head
+        self.tracked = tracked
+        self.changed = changed
+        self.dirty = dirty
+        self.counts = counts
+
+    def is_trusted(self, relative_path: str) -> bool:
+        """Вернуть True, если заметка точно не менялась."""
+        return (
+            relative_path in self.tracked
+            and relative_path not in self.changed
+        )
+
+    def make_state(self, saved: Iterable[str]) -> GitState:
+        """Вернуть состояние для следующего запуска.
+
+        Заметки, переписанные при обработке, теперь тоже отличаются
+        от HEAD, даже если до неё не отличались.
+        """
+        return GitState(head=self.head, dirty=sorted(self.dirty.union(saved)))
+
+
+def read_changes(path: Path, state: dict) -> GitChanges | None:
+    """Узнать у git, какие заметки менялись с прошлого запуска.
+
+    Сравнивается коммит, бывший HEAD в прошлый раз, с рабочим
+    каталогом, сюда же добавляются заметки, которые уже тогда
+    отличались от него. Сеть не нужна: git читает только свой индекс
+    и файлы. Если каталог не в репозитории или git не установлен,
+    возвращает None. Если прошлое состояние неизвестно, ничему
+    не верит, но запоминает текущее.
+    """
+    head = _run(path, 'rev-parse', '--verify', '--quiet', 'HEAD^{commit}')
+    if head is None:
+        return None
+
+    head = head.strip()
+    current = _read_diff(path, head)
+    if current is None:
+        return None
+
+    dirty = {
+        relative
+        for _, relative in current
+        if storage.is_note_path(relative)
+    }
+    base = state.get('head')
+
+    if base == head:
+        since = current
+    elif base and _run(path, 'cat-file', '-e', f'{base}^{{commit}}') == '':
+        since = _read_diff(path, base)
+    else:
+        since = None
+
+    tracked_output = None if since is None else _run(path, 'ls-files', '-z')
+    if since is None or tracked_output is None:
+        return GitChanges(head, set(), set(), dirty, {})
+
+    counts = dict.fromkeys(('added', 'modified', 'deleted', 'renamed'), 0)
+    changed = set(state.get('dirty', []))
+
+    for status, relative in since:
+        if storage.is_note_path(relative):
+            counts[STATUS_NAMES.get(status, 'modified')] += 1
+            changed.add(relative)
+
+    return GitChanges(
+        head=head,
+        tracked=set(tracked_output.split('\0')[:-1]),
+        changed=changed,
+        dirty=dirty,
+        counts=counts,
+    )
+
+
+def _run(path: Path, *arguments: str) -> str | None:
+    """Выполнить команду git в каталоге, вернуть вывод или None."""
+    try:
+        result = subprocess.run(
+            ['git', '-C', str(path), *arguments],
+            capture_output=True,
+            check=True,
+            # не трогать индекс: он может быть занят другим процессом git
+            env={**os.environ, 'GIT_OPTIONAL_LOCKS': '0'},
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return result.stdout.decode('utf-8', errors='surrogateescape')
+
+
+def _read_diff(path: Path, commit: str) -> list[tuple[str, str]] | None:
+    """Вернуть пути, которые в рабочем каталоге отличаются от коммита.
+
+    Пути даны относительно каталога, для переименований - новый путь.
+    """
+    output = _run(
+        path,
+        'diff',
+        '--name-status',
+        '-z',
+        '--find-renames',
+        '--relative',
+        '--ignore-submodules',
+        '--no-ext-diff',
+        commit,
+        '--',
+    )
+    if output is None:
+        return None
+
+    fields = output.split('\0')[:-1]
+    changes = []
+    position = 0
+
+    while position < len(fields):
+        status = fields[position][0]
+        if status in 'RC':
+            # старый путь, затем новый
+            position += 2
+        else:
+            position += 1
+        changes.append((status, fields[position]))
+        position += 1
+
+    return changes
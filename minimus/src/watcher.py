@@ -0,0 +1,287 @@
+"""Модуль наблюдения за каталогом с заметками.
+"""
+from concurrent.futures import Executor
+import ctypes
+import ctypes.util
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import time
+from typing import Protocol
+
+from minimus.src import constants
+from minimus.src import disk
+from minimus.src import objects
+from minimus.src import output
+from minimus.src import pipeline
+from minimus.src import runner
+from minimus.src import storage
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+)
+
+# struct inotify_event без имени: wd, mask, cookie, len
+EVENT_FORMAT = 'iIII'
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+
+
+class EventSource(Protocol):
+    """Источник событий файловой системы."""
+
+    def wait(self, timeout: float | None) -> bool:
+        """Дождаться событий, вернуть True если затронуты заметки."""
+
+    def ignore(self, written: dict[Path, disk.Signature | None]) -> None:
+        """Не считать изменениями файлы, оставшиеся такими после записи."""
+
+    def close(self) -> None:
+        """Освободить ресурсы."""
+
+
+def is_own_write(
+    written: dict[Path, disk.Signature | None],
+    path: str | Path,
+) -> bool:
+    """Вернуть True если файл остался таким, каким его записала обработка.
+
+    Если после записи файл успели изменить, это чужое изменение
+    и пропускать его нельзя.
+    """
+    real_path = Path(os.path.realpath(path))
+    return (
+        real_path in written
+        and disk.get_signature(real_path) == written[real_path]
+    )
+
+
+class Inotify:
+    """Источник событий на основе inotify, работает только в Linux."""
+
+    def __init__(self, root: Path) -> None:
+        """Инициализировать экземпляр."""
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._descriptor = self._libc.inotify_init1(
+            os.O_NONBLOCK | os.O_CLOEXEC
+        )
+
+        if self._descriptor < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        self._folders: dict[int, str] = {}
+        self._written: dict[Path, disk.Signature | None] = {}
+        self._add_tree(str(root))
+
+    def _add_tree(self, folder: str) -> None:
+        """Подписаться на события каталога и всех вложенных в него."""
+        folders = [folder]
+
+        while folders:
+            current = folders.pop()
+            watch_descriptor = self._libc.inotify_add_watch(
+                self._descriptor,
+                os.fsencode(current),
+                WATCH_MASK,
+            )
+
+            if watch_descriptor < 0:
+                continue
+
+            self._folders[watch_descriptor] = current
+
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir() and storage.can_handle_this_folder(
+                        entry.name
+                    ):
+                        folders.append(entry.path)
+
+    def wait(self, timeout: float | None) -> bool:
+        """Дождаться событий, вернуть True если затронуты заметки."""
+        ready, _, _ = select.select([self._descriptor], [], [], timeout)
+        if not ready:
+            return False
+
+        try:
+            data = os.read(self._descriptor, 64 * 1024)
+        except BlockingIOError:
+            return False
+
+        relevant = False
+        offset = 0
+        while offset < len(data):
+            watch_descriptor, mask, _, length = struct.unpack_from(
+                EVENT_FORMAT, data, offset
+            )
+            offset += EVENT_SIZE
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                relevant = True
+
+            elif mask & IN_IGNORED:
+                self._folders.pop(watch_descriptor, None)
+
+            elif mask & IN_ISDIR:
+                if storage.can_handle_this_folder(name):
+                    relevant = True
+                    folder = self._folders.get(watch_descriptor)
+                    if folder and mask & (IN_CREATE | IN_MOVED_TO):
+                        self._add_tree(os.path.join(folder, name))
+
+            elif storage.can_handle_this_file(name):
+                folder = self._folders.get(watch_descriptor)
+                if folder is None or not is_own_write(
+                    self._written,
+                    os.path.join(folder, name),
+                ):
+                    relevant = True
+
+        return relevant
+
+    def ignore(self, written: dict[Path, disk.Signature | None]) -> None:
+        """Не считать изменениями файлы, оставшиеся такими после записи."""
+        self._written = written
+
+    def close(self) -> None:
+        """Освободить ресурсы."""
+        os.close(self._descriptor)
+
+
+class Poller:
+    """Запасной источник событий: периодический опрос файловой системы."""
+
+    def __init__(self, root: Path) -> None:
+        """Инициализировать экземпляр."""
+        self.root = root
+        self._written: dict[Path, disk.Signature | None] = {}
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> dict[Path, disk.Signature]:
+        """Запомнить состояние всех заметок."""
+        return {
+            file.path: (
+                file.stat.st_size,
+                file.stat.st_mtime_ns,
+                file.stat.st_ino,
+            )
+            for file in storage.iter_files(self.root)
+        }
+
+    def wait(self, timeout: float | None) -> bool:
+        """Дождаться событий, вернуть True если затронуты заметки."""
+        if timeout is None:
+            timeout = constants.POLL_INTERVAL
+        time.sleep(min(timeout, constants.POLL_INTERVAL))
+
+        snapshot = self._take_snapshot()
+        changed = [
+            path
+            for path in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(path) != self._snapshot.get(path)
+        ]
+        self._snapshot = snapshot
+        return any(not is_own_write(self._written, path) for path in changed)
+
+    def ignore(self, written: dict[Path, disk.Signature | None]) -> None:
+        """Не считать изменениями файлы, оставшиеся такими после записи."""
+        self._written = written
+
+    def close(self) -> None:
+        """Освободить ресурсы."""
+
+
+def make_event_source(root: Path) -> EventSource:
+    """Выбрать лучший доступный источник событий."""
+    if sys.platform.startswith('linux'):
+        try:
+            return Inotify(root)
+        except (OSError, AttributeError):
+            pass
+
+    return Poller(root)
+
+
+def watch(
+    path: Path,
+    settings: objects.Settings,
+    cache: objects.Cache,
+    reporter: output.Reporter,
+) -> None:
+    """Обрабатывать каталог при каждом изменении заметок.
+
+    Кеш и пул исполнителей живут всё время наблюдения, поэтому
+    повторная обработка затрагивает только изменившиеся заметки.
+    Пачки событий, например от git checkout, склеиваются в одну
+    обработку, если между ними проходит меньше debounce секунд.
+    События от файлов, которые обработка записала сама, пропускаются,
+    иначе она повторялась бы впустую. Если такой файл успели изменить
+    ещё раз, событие не пропускается.
+    """
+    source = make_event_source(path)
+    executor = pipeline.make_executor(settings)
+
+    try:
+        source.ignore(_run(path, settings, cache, executor, reporter))
+        reporter.header('Наблюдение за изменениями, для выхода нажмите Ctrl+C')
+        reporter.flush()
+
+        while True:
+            if not source.wait(None):
+                continue
+
+            while source.wait(settings.debounce):
+                pass
+
+            source.ignore(_run(path, settings, cache, executor, reporter))
+
+    except KeyboardInterrupt:
+        reporter.header('Наблюдение остановлено')
+        reporter.flush()
+
+    finally:
+        source.close()
+        cache.close()
+        if executor is not None:
+            executor.shutdown()
+
+
+def _run(
+    path: Path,
+    settings: objects.Settings,
+    cache: objects.Cache,
+    executor: Executor | None,
+    reporter: output.Reporter,
+) -> dict[Path, disk.Signature | None]:
+    """Выполнить одну обработку, вернуть записанные ею файлы."""
+    start_time = time.perf_counter()
+    writer = disk.Writer(fsync=settings.fsync)
+    runner.run(
+        path,
+        settings,
+        cache,
+        executor,
+        reporter=reporter,
+        writer=writer,
+    )
+    reporter.complete(time.perf_counter() - start_time)
+    return writer.written